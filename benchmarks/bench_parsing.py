@@ -0,0 +1,120 @@
+"""
+Measures the throughput of the deadline and note parsers on a manifest built by repeating data/packages.csv,
+against the strptime and per-call regex parsers that PackageLoader used before NoteParser.
+
+Run from the repository root:
+    python -m benchmarks.bench_parsing [rows]
+"""
+
+import csv
+import re
+import sys
+import time
+from datetime import datetime
+
+from wgups.dataloader import NoteParser
+
+
+def load_rows(file: str, count: int) -> list[list[str]]:
+    """
+    Returns count rows of the csv file, repeating its rows as needed.
+    """
+    with open(file, 'r') as csvfile:
+        reader = csv.reader(csvfile, delimiter=',')
+        next(reader)
+        rows = [row for row in reader if row]
+    return [rows[i % len(rows)] for i in range(count)]
+
+
+def legacy_parse_deadline(deadline_str: str):
+    """
+    The deadline parser of PackageLoader before NoteParser, kept as the baseline.
+    """
+    # if the deadline is EOD, return None
+    if deadline_str.strip().upper() == 'EOD':
+        return None
+
+    # if the deadline is not EOD, parse the deadline and return a datetime object
+    try:
+        return datetime.strptime(deadline_str.strip(), '%I:%M %p')
+    except ValueError:
+        raise ValueError('Invalid deadline string')
+
+
+def legacy_parse_note(note_str: str):
+    """
+    The note parser of PackageLoader before NoteParser, kept as the baseline.
+    """
+    note_str = note_str.lower() # converts the note to lowercase
+    required_truck = None
+    available_time = None
+    grouped_packages = None
+    wrong_address = False
+
+    # if the note contains the word "truck", parse the truck number
+    if "truck" in note_str:
+        match = re.search(r'truck\s*(\d+)', note_str)
+        if match:
+            required_truck = int(match.group(1))
+
+    # if the note contains the word "delayed", parse the time
+    if "delayed" in note_str:
+        match = re.search(r'\b\d{1,2}:\d{2}\s*(?:am|pm)\b', note_str)
+        if match:
+            time_obj = datetime.strptime(match.group(), '%I:%M %p')
+            available_time = time_obj
+
+    # if the note contains the word "must be delivered with", parse the package ids
+    if "must be delivered with" in note_str:
+        match = re.findall(r'\d+', note_str)
+        if match:
+            grouped_packages = list(map(int, match))
+
+    # if the note contains the word "wrong address", set the wrong address to true
+    if "wrong address" in note_str:
+        wrong_address = True
+
+    return required_truck, available_time, grouped_packages, wrong_address
+
+
+def check_parity(rows: list[list[str]]) -> None:
+    """
+    Raises an AssertionError if NoteParser does not give the same results as the legacy parsers.
+    """
+    for row in rows:
+        assert NoteParser.parse_deadline(row[5]) == legacy_parse_deadline(row[5]), row[5]
+        truck, available_time, grouped, wrong_address = NoteParser.parse_note(row[7])
+        grouped = list(grouped) if grouped is not None else None # NoteParser shares its cached result as a tuple
+        assert (truck, available_time, grouped, wrong_address) == legacy_parse_note(row[7]), row[7]
+
+
+def run(rows: list[list[str]], parse_deadline, parse_note) -> float:
+    """
+    Parses the deadline and note of every row and returns the elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    for row in rows:
+        parse_deadline(row[5])
+        parse_note(row[7])
+    return time.perf_counter() - start
+
+
+def main(count: int = 200_000) -> None:
+    rows = load_rows("data/packages.csv", count)
+    check_parity(rows[:1000])
+
+    legacy = run(rows, legacy_parse_deadline, legacy_parse_note)
+    # the functions wrapped by lru_cache parse every row from scratch with the compiled patterns
+    compiled = run(rows, NoteParser.parse_deadline.__wrapped__, NoteParser.parse_note.__wrapped__)
+    NoteParser.parse_deadline.cache_clear()
+    NoteParser.parse_note.cache_clear()
+    cached = run(rows, NoteParser.parse_deadline, NoteParser.parse_note)
+
+    print(f"{count} rows")
+    print(f"legacy (strptime, per-call re): {legacy:.3f}s ({count / legacy:,.0f} rows/s)")
+    print(f"compiled, uncached:             {compiled:.3f}s ({count / compiled:,.0f} rows/s, {legacy / compiled:.1f}x)")
+    print(f"compiled, cached:               {cached:.3f}s ({count / cached:,.0f} rows/s, {legacy / cached:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,87 @@
+"""
+Measures how far the local search is from the exact Held-Karp solution, on random truckloads of data/packages.csv
+leaving the hub at 8:00 AM. The local search starts from the packages sorted by deadline.
+
+Both visit each stop once, so the gap is measured against the shortest such route. The raw distance file does not
+satisfy the triangle inequality, so a route that visits a stop twice can be shorter still, see HeldKarpSolver.
+
+Run from the repository root:
+    python -m benchmarks.bench_routing [routes]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from wgups.HeldKarpSolver import HeldKarpSolver
+from wgups.LocalSearch import LocalSearch
+from wgups.Routing import SPEED
+from wgups.dataloader.PackageLoader import PackageLoader
+from wgups.datastore.DistanceMap import DistanceMap
+from wgups.datastore.PackageHashMap import PackageHashMap
+
+START_TIME = datetime(1900, 1, 1, 8, 0)
+
+
+def route_distance(distance_map: DistanceMap, hub: int, route: list) -> float:
+    """
+    Returns the length of the route, the return to the hub included.
+    """
+    node, total = hub, 0.0
+    for package in route:
+        total += distance_map.get_distance_by_index(node, package.node)
+        node = package.node
+    return total + distance_map.get_distance_by_index(node, hub)
+
+
+def is_on_time(distance_map: DistanceMap, hub: int, route: list) -> bool:
+    """
+    Returns whether every package of the route is delivered by its deadline.
+    """
+    node, arrival = hub, START_TIME
+    for package in route:
+        arrival += timedelta(hours=distance_map.get_distance_by_index(node, package.node) / SPEED)
+        node = package.node
+        if package.deadline and arrival > package.deadline:
+            return False
+    return True
+
+
+def main(count: int = 200) -> None:
+    distance_map = DistanceMap("data/distances.csv")
+    packages = list(PackageLoader("data/packages.csv", PackageHashMap(61, 1, 1, .75), distance_map).get_map())
+    hub = distance_map.get_index("HUB")
+    local_search = LocalSearch(distance_map, hub, SPEED)
+    solver = HeldKarpSolver(distance_map, hub, SPEED)
+
+    rng = random.Random(0)
+    gaps = []
+    heuristic_time = exact_time = 0.0
+    while len(gaps) < count:
+        route = sorted(rng.sample(packages, 16), key=lambda package: package.deadline or datetime.max)
+        if not is_on_time(distance_map, hub, route):
+            continue # the local search only improves routes that are already on time
+
+        start = time.perf_counter()
+        exact = solver.solve(route, START_TIME)
+        exact_time += time.perf_counter() - start
+        if exact is None:
+            continue # cannot happen for a route that is already on time
+
+        start = time.perf_counter()
+        heuristic = local_search.optimize(route, START_TIME)
+        heuristic_time += time.perf_counter() - start
+
+        optimal = route_distance(distance_map, hub, exact)
+        gaps.append(route_distance(distance_map, hub, heuristic) / optimal - 1)
+
+    gaps.sort()
+    print(f"{count} routes of 16 packages")
+    print(f"local search gap to held-karp: mean {100 * sum(gaps) / count:.2f}%, median {100 * gaps[count // 2]:.2f}%, "
+          f"worst {100 * gaps[-1]:.2f}%, optimal in {sum(gap < 1e-9 for gap in gaps)} routes")
+    print(f"local search: {heuristic_time / count * 1000:.1f} ms/route, held-karp: {exact_time / count * 1000:.1f} ms/route")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
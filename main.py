@@ -6,9 +6,9 @@ from wgups.Routing import Routing
 from wgups.SimulationClock import SimulationClock
 from wgups.Truck import Truck
 
-from wgups.dataloader.PackageLoader import PackageLoader
+from wgups.dataloader.ManifestCache import ManifestCache
 from wgups.datastore.PackageHashMap import PackageHashMap
-from wgups.datastore.DistanceMap import DistanceMap
+from wgups.datastore.CoordinateOracle import CoordinateOracle
 
 # Maurice Toney Student ID:012549854
 
@@ -19,9 +19,10 @@ END_TIME = datetime(1900, 1, 1, 17, 0)  # Simulation end time (5:00 PM)
 
 # Initialize simulation components
 clock = SimulationClock(START_TIME)  # Initialize simulation clock
-packages = PackageLoader("data/packages.csv", PackageHashMap(61, 1, 1, .75)).get_map()  # Load packages from CSV
-distances = DistanceMap("data/distances.csv")  # Load distance data from CSV
-routing = Routing(distances, packages, clock)  # Initialize routing system
+oracle = CoordinateOracle.from_csv("wgups/dataloader/packages_with_coords.csv")  # Estimates the distances of addresses missing from distances.csv
+manifest = ManifestCache("data/packages.csv", "data/distances.csv", oracle=oracle)  # Parsed packages and distances, cached until the CSV files or the oracle change
+packages, distances = manifest.load(PackageHashMap(61, 1, 1, .75))  # Load packages and distance data from the cache or the CSV files
+routing = Routing(distances, packages, clock, constraints=manifest.constraints)  # Initialize routing system
 
 # Schedule special events for package availability and address updates
 
@@ -145,9 +146,8 @@ def get_all_packages_at_time(query_time: datetime) -> None:
     :param query_time: The time to check all package statuses at
     """
     print(f"\nStatus at {query_time.strftime('%H:%M')}:")
-    for p in packages.packages_table:
-        if isinstance(p, Package):
-            print(get_package_status_at_time(p, query_time))
+    for p in packages:
+        print(get_package_status_at_time(p, query_time))
 
 def get_user_time_input() -> Optional[datetime]:
     """
@@ -0,0 +1,127 @@
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from wgups.Package import Package
+from wgups.datastore.DistanceMap import DistanceMap
+
+DEFAULT_MAX_STOPS = 16 # 2^16 subsets of 16 stops, a few megabytes of tables
+MAX_STOPS_LIMIT = 20 # 2^20 subsets of 20 stops already take 160 MB for the distances alone
+TOLERANCE = 1e-9 # miles of rounding allowed when comparing a distance with a deadline
+
+
+class HeldKarpSolver:
+    """
+    This class is used to find the shortest route through a truck's packages that meets every deadline,
+    with the Held-Karp dynamic program over the subsets of stops.
+
+    The packages at the same node form one stop, due by the earliest deadline among them. For every subset of stops
+    and every last stop, the tables keep the shortest distance from the hub that visits the subset and ends there
+    on time, and the stop before it. Since the trucks never wait, the shortest such path is also the earliest,
+    so keeping only the shortest one per state is exact. The subsets are filled one size at a time, every
+    subset of a size in one numpy operation per next stop. The route ends with the return to the hub.
+
+    The result is the shortest route that visits each stop once. It is the shortest route overall only when the
+    distances satisfy the triangle inequality, as they do with the metric closure of the distance map. On the raw
+    distance file, splitting the packages of one node over two visits can be shorter, since a detour through another
+    stop can beat the direct leg, and such routes are not considered.
+
+    Routes with more stops than max_stops are left to the heuristic, see Routing.build_route.
+    """
+    def __init__(self, distance_map: DistanceMap, hub: int, speed: float, max_stops: int = DEFAULT_MAX_STOPS):
+        """
+        Initializes the HeldKarpSolver class.
+
+        :param distance_map: the distances between the nodes
+        :param hub: the node of the hub
+        :param speed: the average speed of the trucks in miles per hour
+        :param max_stops: the largest number of stops solved exactly, at most MAX_STOPS_LIMIT
+        :raises ValueError: if max_stops is negative or above MAX_STOPS_LIMIT, since the tables grow as 2^max_stops
+        """
+        if not 0 <= max_stops <= MAX_STOPS_LIMIT:
+            raise ValueError(f"max_stops must be between 0 and {MAX_STOPS_LIMIT}, got {max_stops}")
+        self.distance_map = distance_map
+        self.hub = hub
+        self.speed = speed
+        self.max_stops = max_stops
+        self.best_distance: Optional[float] = None # the length of the last route solved, the return to the hub included
+
+    def solve(self, route: list[Package], start_time: datetime) -> Optional[list[Package]]:
+        """
+        Returns the packages in the order of the shortest route that visits each stop once and meets every deadline,
+        or None if the route has more stops than max_stops or no order meets every deadline.
+
+        :param route: the packages of the route, whose order is kept between packages at the same stop
+        :param start_time: the time the truck leaves the hub
+        """
+        self.best_distance = None
+        packages_at_node: dict[int, list[Package]] = {}
+        for package in route:
+            packages_at_node.setdefault(package.node, []).append(package)
+        at_hub = packages_at_node.pop(self.hub, []) # delivered as the truck leaves
+        nodes = list(packages_at_node)
+        count = len(nodes)
+        if count > self.max_stops:
+            return None
+        if count == 0:
+            self.best_distance = 0.0
+            return at_hub
+
+        points = [self.hub] + nodes
+        distance = self.distance_map.get_submatrix(points)
+        from_hub, to_hub, between = distance[0, 1:], distance[1:, 0], distance[1:, 1:]
+        miles_per_second = self.speed / 3600.0
+        budgets = np.array([self.get_budget(packages_at_node[node], start_time, miles_per_second) for node in nodes]) # the longest distance at which each stop is still on time
+        budgets += TOLERANCE
+
+        size = 1 << count
+        best = np.full((size, count), np.inf) # [subset, last stop] -> shortest on-time distance from the hub
+        previous = np.full((size, count), -1, dtype=np.min_scalar_type(-count)) # [subset, last stop] -> the stop before the last one
+        singles = 1 << np.arange(count)
+        best[singles, np.arange(count)] = np.where(from_hub <= budgets, from_hub, np.inf)
+
+        masks = np.arange(size)
+        sizes = np.zeros(size, dtype=np.int64)
+        for stop in range(count):
+            sizes += (masks >> stop) & 1
+
+        for subset_size in range(1, count):
+            subsets = masks[sizes == subset_size]
+            reached = best[subsets] # (subsets, last stop)
+            for stop in range(count):
+                open_subsets = (subsets >> stop) & 1 == 0
+                if not open_subsets.any():
+                    continue
+                candidates = reached[open_subsets] + between[:, stop] # (subsets, last stop) distances when going on to stop
+                last = np.argmin(candidates, axis=1)
+                extended = candidates[np.arange(len(last)), last]
+                extended[extended > budgets[stop]] = np.inf # too late for stop
+                targets = subsets[open_subsets] | (1 << stop)
+                better = extended < best[targets, stop]
+                best[targets[better], stop] = extended[better]
+                previous[targets[better], stop] = last[better]
+
+        totals = best[size - 1] + to_hub
+        stop = int(np.argmin(totals))
+        if not np.isfinite(totals[stop]):
+            return None
+        self.best_distance = float(totals[stop])
+
+        order = []
+        subset = size - 1
+        while stop != -1:
+            order.append(stop)
+            stop, subset = int(previous[subset, stop]), subset & ~(1 << stop)
+        order.reverse()
+        return at_hub + [package for stop in order for package in packages_at_node[nodes[stop]]]
+
+    @staticmethod
+    def get_budget(packages: list[Package], start_time: datetime, miles_per_second: float) -> float:
+        """
+        Returns the longest distance the truck can travel before reaching the packages without missing a deadline.
+        """
+        deadlines = [package.deadline for package in packages if package.deadline]
+        if not deadlines:
+            return np.inf
+        return (min(deadlines) - start_time).total_seconds() * miles_per_second
@@ -0,0 +1,113 @@
+import heapq
+import itertools
+from datetime import timedelta
+from typing import Optional
+
+from wgups.Package import Package
+from wgups.Route import HUB, Route
+
+
+class InsertionEngine:
+    """
+    This class is used to insert packages into a route by cheapest insertion, within the slack time of the route.
+
+    The cost of inserting a package between two consecutive stops is the travel time of the two legs to and from
+    the package. Inserting between two packages is only allowed when it is faster than the direct leg it replaces,
+    while the first leg from the hub has no such check.
+
+    Each package not in the route keeps its cheapest insertion in a heap. Inserting a package replaces one leg with
+    two, so only the two new legs are scored against every remaining package. The heap entries of the replaced leg
+    are left in place and recognized as stale when they reach the top, at which point that package's cheapest
+    insertion is searched again over the whole route.
+    """
+    def __init__(self, route: Route, packages: list[Package], slack_time: timedelta):
+        """
+        Initializes the InsertionEngine class.
+
+        :param route: the route the packages are inserted into
+        :param packages: the packages to insert
+        :param slack_time: the time the route can be extended by
+        """
+        self.route = route
+        self.travel_times = route.travel_times
+        self.slack_time = slack_time
+        self.remaining: dict[int, Package] = {pkg.package_id: pkg for pkg in packages if pkg.package_id not in route} # in their original order
+        self.best_cost: dict[int, timedelta] = {} # package id -> the cost of its cheapest insertion pushed on the heap
+        self.heap: list[tuple[timedelta, int, int, Optional[int], int]] = [] # (cost, counter, package id, previous stop, next stop)
+        self.counter = itertools.count() # breaks ties between equal costs in push order
+
+    def get_insertion_cost(self, package: Package, previous_stop: Optional[int], next_stop: int) -> Optional[timedelta]:
+        """
+        Returns the cost of inserting the package between two consecutive stops, or None if the insertion is not allowed.
+        """
+        previous_node = self.route.get_node(previous_stop)
+        next_node = self.route.get_node(next_stop)
+        cost = self.travel_times.get(previous_node, package.node) + self.travel_times.get(package.node, next_node)
+        if cost > self.slack_time:
+            return None
+        if previous_stop is not HUB and cost >= self.travel_times.get(previous_node, next_node):
+            return None
+        return cost
+
+    def push_best(self, package: Package) -> None:
+        """
+        Searches the whole route for the cheapest insertion of the package and pushes it on the heap.
+        """
+        best = None
+        previous_stop, next_stop = HUB, self.route.first()
+        while next_stop is not None:
+            cost = self.get_insertion_cost(package, previous_stop, next_stop)
+            if cost is not None and (best is None or cost < best[0]):
+                best = (cost, previous_stop, next_stop)
+            previous_stop, next_stop = next_stop, self.route.get_next(next_stop)
+
+        if best is None:
+            self.best_cost.pop(package.package_id, None) # no insertion is allowed with the current slack
+            return
+        self.push(package.package_id, *best)
+
+    def push(self, package_id: int, cost: timedelta, previous_stop: Optional[int], next_stop: int) -> None:
+        self.best_cost[package_id] = cost
+        heapq.heappush(self.heap, (cost, next(self.counter), package_id, previous_stop, next_stop))
+
+    def insert(self, package: Package, previous_stop: Optional[int], next_stop: int) -> None:
+        """
+        Inserts the package between two consecutive stops and scores the two new legs against the remaining packages.
+        """
+        package_id = package.package_id
+        self.route.insert_after(previous_stop, package)
+        del self.remaining[package_id]
+        self.best_cost.pop(package_id, None)
+
+        for other in self.remaining.values():
+            best_cost = self.best_cost.get(other.package_id) # None if no insertion was allowed before
+            for leg in ((previous_stop, package_id), (package_id, next_stop)):
+                cost = self.get_insertion_cost(other, *leg)
+                if cost is not None and (best_cost is None or cost < best_cost):
+                    best_cost = cost
+                    self.push(other.package_id, cost, *leg)
+
+    def run(self) -> tuple[Route, timedelta, list[Package]]:
+        """
+        Inserts the cheapest insertion until none fits in the slack time.
+
+        :return: the route, the remaining slack time, and the packages that were not inserted
+        """
+        if self.route.first() is not None:
+            for package in self.remaining.values():
+                self.push_best(package)
+
+        while self.heap and self.slack_time > timedelta(0):
+            cost, _, package_id, previous_stop, next_stop = heapq.heappop(self.heap)
+            if cost > self.slack_time:
+                break
+            if package_id not in self.remaining:
+                continue # the package was already inserted
+            if not self.route.has_leg(previous_stop, next_stop):
+                if self.best_cost.get(package_id) == cost:
+                    self.push_best(self.remaining[package_id]) # the leg was replaced, search the new route
+                continue
+            self.slack_time -= cost
+            self.insert(self.remaining[package_id], previous_stop, next_stop)
+
+        return self.route, self.slack_time, list(self.remaining.values())
@@ -0,0 +1,172 @@
+import time
+from datetime import datetime
+from typing import Optional
+
+from wgups.Package import Package
+from wgups.Route import Route
+from wgups.datastore.DistanceMap import DistanceMap
+
+EPSILON = 1e-9 # the smallest change in miles that counts as an improvement
+TIME_TOLERANCE = 1e-6 # seconds of rounding allowed when comparing an arrival with a deadline
+
+
+class LocalSearch:
+    """
+    This class is used to shorten a finished route with 2-opt, Or-opt and relocate moves, without making any
+    package miss its deadline.
+
+    The route is handled as a list of stops, where consecutive packages at the same node form one stop.
+    Each move is scored by the change in distance of the few legs it replaces, and checked against the deadlines:
+    the stops whose order changes are checked one by one, and the stops after the move, which are all shifted by
+    the same time, are checked at once against their forward slack, the least time any of them can be delayed by.
+    The first improving move found is applied, until no move improves the route or a budget runs out.
+    """
+    def __init__(self, distance_map: DistanceMap, hub: int, speed: float,
+                 max_iterations: int = 1000, time_limit: Optional[float] = 1.0, segment_lengths: tuple[int, ...] = (1, 2, 3)):
+        """
+        Initializes the LocalSearch class.
+
+        :param distance_map: the distances between the nodes
+        :param hub: the node of the hub
+        :param speed: the average speed of the trucks in miles per hour
+        :param max_iterations: the maximum number of moves applied to one route
+        :param time_limit: the maximum number of seconds spent on one route, None for no limit
+        :param segment_lengths: the lengths of the segments moved by Or-opt, 1 being a relocate move
+        """
+        self.distance_map = distance_map
+        self.hub = hub
+        self.speed = speed
+        self.seconds_per_mile = 3600.0 / speed
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.segment_lengths = segment_lengths
+        self.iterations = 0 # the number of moves applied to the last route
+
+    def optimize(self, route: list[Package], start_time: datetime) -> list[Package]:
+        """
+        Returns the route improved by local search, or the route unchanged if no move improves it,
+        or if it already misses a deadline.
+
+        :param route: the packages in delivery order
+        :param start_time: the time the truck leaves the hub
+        """
+        stops: list[list[Package]] = [] # consecutive packages at the same node
+        for package in route:
+            if stops and stops[-1][0].node == package.node:
+                stops[-1].append(package)
+            else:
+                stops.append([package])
+
+        self.iterations = 0
+        if len(stops) < 2:
+            return route
+        deadlines = [self.get_deadline_seconds(stop, start_time) for stop in stops]
+        if not self.is_feasible(route, start_time, stops, deadlines):
+            return route
+
+        started = time.perf_counter()
+        while self.iterations < self.max_iterations:
+            if self.time_limit is not None and time.perf_counter() - started > self.time_limit:
+                break
+            move = self.find_move(route, start_time, stops, deadlines)
+            if move is None:
+                break
+            stops, deadlines = move
+            route = [package for stop in stops for package in stop]
+            self.iterations += 1
+        return route
+
+    @staticmethod
+    def get_deadline_seconds(stop: list[Package], start_time: datetime) -> float:
+        """
+        Returns the earliest deadline of the packages of a stop, in seconds after the start time.
+        """
+        deadlines = [package.deadline for package in stop if package.deadline]
+        return (min(deadlines) - start_time).total_seconds() if deadlines else float('inf')
+
+    def get_arrivals(self, route: list[Package], start_time: datetime, stops: list[list[Package]]) -> list[float]:
+        """
+        Returns the arrival time at each stop in seconds after the start time, from the cumulative distances of the route.
+        """
+        cumulative = Route(self.distance_map, self.hub, self.speed, start_time, route)
+        return [cumulative.get_distance_travelled(stop[0].package_id) * self.seconds_per_mile for stop in stops]
+
+    def is_feasible(self, route: list[Package], start_time: datetime, stops: list[list[Package]], deadlines: list[float]) -> bool:
+        arrivals = self.get_arrivals(route, start_time, stops)
+        return all(arrival <= deadline + TIME_TOLERANCE for arrival, deadline in zip(arrivals, deadlines))
+
+    def find_move(self, route: list[Package], start_time: datetime, stops: list[list[Package]],
+                  deadlines: list[float]) -> Optional[tuple[list[list[Package]], list[float]]]:
+        """
+        Returns the stops and deadlines after the first improving move that keeps every deadline, or None if there is none.
+        """
+        count = len(stops)
+        nodes = [self.hub] + [stop[0].node for stop in stops] + [self.hub] # the stops are at positions 1 to count
+        d = self.distance_map.get_distance_by_index
+        arrivals = [0.0] + self.get_arrivals(route, start_time, stops) + [float('inf')]
+        limits = [float('inf')] + deadlines + [float('inf')]
+
+        forward_slack = [float('inf')] * (count + 2) # the least slack of the stops from each position to the end
+        for k in range(count, 0, -1):
+            forward_slack[k] = min(limits[k] - arrivals[k], forward_slack[k + 1])
+
+        def suffix_fits(position: int, shift: float) -> bool:
+            # every stop from position on is delayed by shift seconds
+            return shift <= forward_slack[position] + TIME_TOLERANCE
+
+        def visit(time_at: float, previous: int, positions: list[int]) -> Optional[float]:
+            # visits the stops at the positions in that order, leaving the stop at previous at time_at,
+            # and returns the arrival time at the last one, or None if a stop misses its deadline
+            node = nodes[previous]
+            for position in positions:
+                time_at += d(node, nodes[position]) * self.seconds_per_mile
+                if time_at > limits[position] + TIME_TOLERANCE:
+                    return None
+                node = nodes[position]
+            return time_at
+
+        # 2-opt: reverses the stops from i to j
+        for i in range(1, count):
+            for j in range(i + 1, count + 1):
+                delta = (d(nodes[i - 1], nodes[j]) + d(nodes[i], nodes[j + 1])
+                         - d(nodes[i - 1], nodes[i]) - d(nodes[j], nodes[j + 1]))
+                if delta >= -EPSILON:
+                    continue
+                if visit(arrivals[i - 1], i - 1, list(range(j, i - 1, -1))) is None:
+                    continue
+                if not suffix_fits(j + 1, delta * self.seconds_per_mile):
+                    continue
+                order = list(range(1, i)) + list(range(j, i - 1, -1)) + list(range(j + 1, count + 1))
+                return [stops[k - 1] for k in order], [deadlines[k - 1] for k in order]
+
+        # Or-opt and relocate: moves the stops from i to i + length - 1 between the stops at p and p + 1
+        for length in self.segment_lengths:
+            for i in range(1, count - length + 2):
+                last = i + length - 1
+                removal = d(nodes[i - 1], nodes[i]) + d(nodes[last], nodes[last + 1]) - d(nodes[i - 1], nodes[last + 1])
+                segment = list(range(i, last + 1))
+                for p in range(0, count + 1):
+                    if i - 1 <= p <= last:
+                        continue # the segment would stay in place
+                    insertion = d(nodes[p], nodes[i]) + d(nodes[last], nodes[p + 1]) - d(nodes[p], nodes[p + 1])
+                    delta = insertion - removal
+                    if delta >= -EPSILON:
+                        continue
+
+                    if p > last:
+                        # the segment moves after the stops from last + 1 to p, which are visited earlier
+                        between = list(range(last + 1, p + 1))
+                        leave = visit(arrivals[i - 1], i - 1, between)
+                        if leave is None or visit(leave, p, segment) is None:
+                            continue
+                        order = list(range(1, i)) + between + segment + list(range(p + 1, count + 1))
+                    else:
+                        # the segment moves before the stops from p + 1 to i - 1, which are delayed
+                        between = list(range(p + 1, i))
+                        if visit(arrivals[p], p, segment + between) is None:
+                            continue
+                        order = list(range(1, p + 1)) + segment + between + list(range(last + 1, count + 1))
+                    if not suffix_fits(p + 1 if p > last else last + 1, delta * self.seconds_per_mile):
+                        continue
+                    return [stops[k - 1] for k in order], [deadlines[k - 1] for k in order]
+        return None
@@ -10,7 +10,7 @@ f.	Gets loaded into the data structure containing all packages
 
 from enum import Enum
 from datetime import datetime
-from typing import Optional
+from typing import Any, Callable, Optional
 
 class PackageStatus(Enum):
     """
@@ -69,6 +69,7 @@ class Package:
         note (dict): The note of the package, denoting special handling guidelines
         status (PackageStatus): The status of the package, which is a phase in the PackageStatus Enum
         address_w_zip (str): The address of the package with the zip code
+        node (int or None): The index of the package's address within the DistanceMap, used for all distance lookups
         must_be_delivered_with (list[int] or None): The ids of packages that must be delivered at the same time as the package
         available_time (datetime or None): The time the package is available to be delivered
         required_truck (int or None): The truck that is required to deliver the package
@@ -77,7 +78,13 @@ class Package:
         delivery_time (datetime or None): The time the package was delivered
         departure_time (datetime or None): The time the package was loaded onto a truck and left the hub
         truck_carrier (TruckCarrier): The truck that is associated with the package
+        on_change (Callable or None): Called with (package, attribute, old value) when an indexed attribute changes through a setter
     """
+    # every attribute is declared up front so packages carry no per-instance __dict__
+    __slots__ = ('package_id', 'address', 'city', 'state', 'zip_code', 'deadline', 'weight', 'note', 'status',
+                 'address_w_zip', 'node', 'must_be_delivered_with', 'available_time', 'required_truck', 'wrong_address',
+                 'packages_at_same_address', 'delivery_time', 'departure_time', 'truck_carrier', 'on_change')
+
     def __init__(self,
                  package_id: int = 0,
                  address: str = "",
@@ -119,6 +126,7 @@ class Package:
         self.status = status
 
         self.address_w_zip = self.get_address_w_zip() # this is for standardization with the addresses in distances.csv
+        self.node: Optional[int] = None # stores the index of address_w_zip within the distance map, resolved by PackageLoader
 
         self.must_be_delivered_with: Optional[list[int]] = None # stores the ids of packages that must be delivered at the same time as the package
         self.available_time: Optional[datetime] = None # stores the time the package is available to be delivered
@@ -131,8 +139,19 @@ class Package:
         self.departure_time: Optional[datetime] = None
         self.truck_carrier: TruckCarrier = TruckCarrier.NONE
 
+        self.on_change: Optional[Callable[['Package', str, Any], None]] = None # set by PackageHashMap to keep its secondary indexes in sync
+
+    def notify_change(self, attribute: str, old_value: Any) -> None:
+        """
+        Notifies the listener, if any, that an attribute of the package has changed
+        """
+        if self.on_change is not None:
+            self.on_change(self, attribute, old_value)
+
     def set_status(self, status: PackageStatus):
+        old_status = self.status
         self.status = status
+        self.notify_change('status', old_status)
 
     def set_truck(self, truck: TruckCarrier) -> None:
         self.truck_carrier = truck
@@ -175,14 +194,24 @@ class Package:
         """
         self.address_w_zip = address_w_zip
 
+    def set_node(self, node: Optional[int]) -> None:
+        """
+        Sets the index of the package's address within the distance map
+        """
+        old_node = self.node
+        self.node = node
+        self.notify_change('node', old_node)
+
     def set_full_address(self, address: str, city: str, state: str, zip_code: str) -> None:
         """
         Sets the full address of the package
         """
+        old_address = self.address
         self.address = address
         self.city = city
         self.state = state
         self.zip_code = zip_code
+        self.notify_change('address', old_address)
 
     def get_siblings(self) -> list[int]:
         """
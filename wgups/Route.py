@@ -0,0 +1,192 @@
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timedelta
+from typing import Optional
+
+from wgups.Package import Package
+from wgups.datastore.DistanceMap import DistanceMap
+
+HUB = None # the key of the hub, before the first stop of the route
+
+
+class Route:
+    """
+    This class is used to store the ordered stops of a truck route as a doubly-linked list keyed by package id,
+    so that the neighbors of a stop, inserting after a stop and removing a stop are all dictionary operations.
+    A stop is keyed by its package rather than by its node, since several packages can share a node.
+
+    The route also keeps the position of each stop and the cumulative arrival time and distance at each stop,
+    starting from the hub. These are refreshed in one pass from the first stop that changed, the next time one is read.
+    """
+    def __init__(self, distance_map: DistanceMap, hub: int, speed: float, start_time: datetime,
+                 packages: Iterable[Package] = ()):
+        """
+        Initializes the Route class.
+
+        :param distance_map: the distances between the nodes
+        :param hub: the node of the hub
+        :param speed: the average speed of the truck in miles per hour
+        :param start_time: the time the truck leaves the hub
+        :param packages: the stops of the route, in order
+        """
+        self.distance_map = distance_map
+        self.travel_times = distance_map.get_travel_times(speed) # travel time between every pair of nodes at the speed of the truck
+        self.hub = hub
+        self.speed = speed
+        self.start_time = start_time
+        self.stops: dict[int, Package] = {} # package id -> package
+        self.next_stop: dict[Optional[int], Optional[int]] = {HUB: None} # package id -> the next package id, None after the last stop
+        self.previous_stop: dict[Optional[int], Optional[int]] = {HUB: None} # package id -> the previous package id, HUB before the first stop
+        self.last: Optional[int] = HUB # the last stop, HUB if the route is empty
+        self.positions: dict[int, int] = {} # package id -> its position in the route
+        self.arrivals: dict[Optional[int], datetime] = {HUB: start_time} # package id -> the arrival time at the stop
+        self.distances_travelled: dict[Optional[int], float] = {HUB: 0.0} # package id -> the distance travelled up to the stop
+        self.dirty: Optional[int] = HUB # the stop after which the positions, arrivals and distances are out of date
+        self.is_dirty = False # whether any of them is out of date
+        for package in packages:
+            self.append(package)
+
+    def get_node(self, key: Optional[int]) -> int:
+        """
+        Returns the node of a stop, or of the hub.
+        """
+        return self.hub if key is HUB else self.stops[key].node
+
+    def get_travel_time(self, node: int, next_node: int) -> timedelta:
+        return self.travel_times.get(node, next_node)
+
+    def first(self) -> Optional[int]:
+        return self.next_stop[HUB]
+
+    def get_next(self, key: Optional[int]) -> Optional[int]:
+        return self.next_stop[key]
+
+    def get_previous(self, key: int) -> Optional[int]:
+        return self.previous_stop[key]
+
+    def has_leg(self, previous: Optional[int], following: int) -> bool:
+        """
+        Returns whether following is the stop right after previous.
+        """
+        return previous in self.next_stop and self.next_stop[previous] == following
+
+    def mark_dirty(self, key: Optional[int]) -> None:
+        """
+        Records that the cumulative values after the stop are out of date, keeping the earliest such stop.
+        Positions are only compared before the refresh, and every stop without a position was inserted after
+        the stop already recorded, so a stale position still orders the stops correctly.
+        """
+        if self.is_dirty and self.get_stale_position(self.dirty) <= self.get_stale_position(key):
+            return
+        self.dirty, self.is_dirty = key, True
+
+    def get_stale_position(self, key: Optional[int]) -> float:
+        return -1 if key is HUB else self.positions.get(key, float('inf'))
+
+    def insert_after(self, previous: Optional[int], package: Package) -> None:
+        """
+        Inserts a package right after a stop, or at the start of the route when previous is HUB.
+
+        :raises ValueError: if the package is already in the route
+        """
+        key = package.package_id
+        if key in self.stops:
+            raise ValueError(f"Package {key} is already in the route")
+        following = self.next_stop[previous]
+        self.stops[key] = package
+        self.previous_stop[key] = previous
+        self.next_stop[key] = following
+        self.next_stop[previous] = key
+        if following is None:
+            self.last = key
+        else:
+            self.previous_stop[following] = key
+        self.mark_dirty(previous)
+
+    def append(self, package: Package) -> None:
+        """
+        Adds a package at the end of the route.
+        """
+        self.insert_after(self.last, package)
+
+    def remove(self, key: int) -> Package:
+        """
+        Removes a stop from the route and returns its package.
+        """
+        previous, following = self.previous_stop.pop(key), self.next_stop.pop(key)
+        self.next_stop[previous] = following
+        if following is None:
+            self.last = previous
+        else:
+            self.previous_stop[following] = previous
+        self.mark_dirty(previous)
+        self.positions.pop(key, None)
+        self.arrivals.pop(key, None)
+        self.distances_travelled.pop(key, None)
+        return self.stops.pop(key)
+
+    def refresh(self) -> None:
+        """
+        Recomputes the position, arrival time and travelled distance of every stop after the first stop that changed.
+        """
+        if not self.is_dirty:
+            return
+        key = self.dirty
+        position = -1 if key is HUB else self.positions[key]
+        node = self.get_node(key)
+        arrival, distance = self.arrivals[key], self.distances_travelled[key]
+        following = self.next_stop[key]
+        while following is not None:
+            next_node = self.stops[following].node
+            arrival += self.travel_times.get(node, next_node)
+            distance += self.distance_map.get_distance_by_index(node, next_node)
+            position += 1
+            self.positions[following] = position
+            self.arrivals[following] = arrival
+            self.distances_travelled[following] = distance
+            node, following = next_node, self.next_stop[following]
+        self.is_dirty = False
+
+    def get_position(self, key: int) -> int:
+        self.refresh()
+        return self.positions[key]
+
+    def get_arrival(self, key: int) -> datetime:
+        """
+        Returns the arrival time at a stop.
+        """
+        self.refresh()
+        return self.arrivals[key]
+
+    def get_distance_travelled(self, key: int) -> float:
+        """
+        Returns the distance travelled from the hub up to a stop.
+        """
+        self.refresh()
+        return self.distances_travelled[key]
+
+    def get_completion(self) -> tuple[datetime, float]:
+        """
+        Returns the time the truck is back at the hub and the total distance of the route, the return included.
+        """
+        self.refresh()
+        node = self.get_node(self.last)
+        return (self.arrivals[self.last] + self.get_travel_time(node, self.hub),
+                self.distances_travelled[self.last] + self.distance_map.get_distance_by_index(node, self.hub))
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.stops
+
+    def __len__(self):
+        return len(self.stops)
+
+    def __iter__(self) -> Iterator[Package]:
+        """
+        Iterates over the packages of the route in order.
+        """
+        key = self.next_stop[HUB]
+        while key is not None:
+            yield self.stops[key]
+            key = self.next_stop[key]
+
+    def to_list(self) -> list[Package]:
+        return list(self)
@@ -1,12 +1,22 @@
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Any
+from typing import Optional
 
+from wgups.HeldKarpSolver import DEFAULT_MAX_STOPS, HeldKarpSolver
+from wgups.InsertionEngine import InsertionEngine
+from wgups.LocalSearch import LocalSearch
 from wgups.Package import Package
+from wgups.Route import Route
 
 from wgups.SimulationClock import SimulationClock
+from wgups.dataloader.ConstraintGraph import ConstraintGraph
 from wgups.datastore.DistanceMap import DistanceMap
+from wgups.datastore.EligibilityIndex import WRONG_ADDRESS, EligibilityIndex
+from wgups.datastore.KeyedPriorityQueue import KeyedPriorityQueue
 from wgups.datastore.PackageHashMap import PackageHashMap
 
+SPEED = 18.0 # the average speed of the trucks in miles per hour, shared by the routes planned here and the Truck class
+
 
 class Routing:
     """
@@ -16,43 +26,73 @@ class Routing:
         distance_map (DistanceMap): The distance map of the packages
         packages (PackageHashMap): The hash map of the packages
         clock (SimulationClock): The clock of the simulation
+        constraints (ConstraintGraph): The co-delivery groups and truck pins of the packages
     """
 
-    def __init__(self, distance_map: DistanceMap, packages: PackageHashMap, clock:SimulationClock):
+    def __init__(self, distance_map: DistanceMap, packages: PackageHashMap, clock:SimulationClock, speed: float = SPEED,
+                 exact_stop_limit: int = DEFAULT_MAX_STOPS, constraints: Optional[ConstraintGraph] = None,
+                 local_search_iterations: int = 1000, local_search_time_limit: Optional[float] = 1.0):
         """
         Initializes the Routing object
 
         :param distance_map: The distance map of the packages
         :param packages: The hash map of the packages
         :param clock: The clock of the simulation
+        :param speed: The average speed of the trucks in miles per hour
+        :param exact_stop_limit: Routes with at most this many stops are sequenced exactly, 0 always uses the heuristic
+        :param constraints: The constraint graph built by the package loader, None builds it from the packages
+        :param local_search_iterations: The maximum number of moves the local search applies to one route
+        :param local_search_time_limit: The maximum number of seconds the local search spends on one route, None for no limit
         """
         self.distance_map = distance_map # stores the distance map of the packages, which is used to calculate the distance between addresses
         self.packages = packages # stores the hash map of the packages
         self.clock = clock # stores the clock of the simulation
+        self.constraints = constraints or ConstraintGraph.from_packages(self.packages) # answers which packages travel together and which truck they need
 
         self.MAX_SIZE = 16
+        self.SPEED = speed
+        self.hub = self.distance_map.get_index("HUB") # the node of the HUB within the distance map
+        self.resolve_nodes()
+        self.columns = self.packages.enable_columns() if isinstance(self.packages, PackageHashMap) else None # the nodes of the packages, read without touching the packages
+        self.hub_distances: dict[int, float] = {} # package id -> its distance from the hub, for the packages of the last priority queue
+        self.travel_times = self.distance_map.get_travel_times(self.SPEED) # travel time between every pair of nodes at the speed of the trucks
+        self.eligibility = EligibilityIndex(self.packages, self.constraints) # the packages that can be loaded, kept up to date by clock events
+        self.eligibility.schedule_releases(self.clock, self.packages)
+        self.local_search = LocalSearch(self.distance_map, self.hub, self.SPEED, local_search_iterations,
+                                        local_search_time_limit) # improves the routes the exact solver does not sequence, see build_route
+        self.exact_solver = HeldKarpSolver(self.distance_map, self.hub, self.SPEED, exact_stop_limit) # sequences the routes with few enough stops, visiting each stop once
+
+    def resolve_nodes(self) -> None:
+        """
+        Resolves the node of every package that has none, for the packages loaded without a distance map
+
+        :return: None
+        """
+        unresolved = [package for package in self.packages if package.node is None]
+        nodes = self.distance_map.add_addresses([package.address_w_zip for package in unresolved]) # adds the missing addresses in one pass
+        for package, node in zip(unresolved, nodes):
+            package.set_node(node) # resolves the node of the package's address once
 
-    def get_travel_time(self, current_stop: str, next_stop: str) -> timedelta:
+    def get_travel_time(self, current_stop: int, next_stop: int) -> timedelta:
         """
-        Returns the travel time between two addresses
+        Returns the travel time between two nodes of the distance map
 
-        :param current_stop: The current location of the truck
-        :param next_stop: The next location of the truck
-        :return: The travel time between the two addresses
+        :param current_stop: The node of the current location of the truck
+        :param next_stop: The node of the next location of the truck
+        :return: The travel time between the two nodes
         """
-        distance = self.distance_map.get_distance(current_stop, next_stop) # gets the distance between the two stops
-        return timedelta(hours=distance / 18.0) # returns the travel time between the two stops
+        return self.travel_times.get(current_stop, next_stop) # returns the precomputed travel time between the two stops
 
-    def get_estimated_delivery_time(self, current_time:datetime, current_location: str, address_w_zip: str) -> datetime:
+    def get_estimated_delivery_time(self, current_time:datetime, current_location: int, node: int) -> datetime:
         """
         Returns the estimated delivery time of a package
 
         :param current_time: The current time of the simulation
-        :param current_location: The current location of the truck
-        :param address_w_zip: The address of the package
+        :param current_location: The node of the current location of the truck
+        :param node: The node of the address of the package
         :return: The estimated delivery time of the package
         """
-        return current_time + self.get_travel_time(current_location, address_w_zip) # returns the elapsed time between the current time and the estimated delivery time
+        return current_time + self.get_travel_time(current_location, node) # returns the elapsed time between the current time and the estimated delivery time
 
     def update_address(self, package_id: int) -> None:
         """
@@ -64,8 +104,10 @@ class Routing:
         package = self.packages[package_id] # gets the package from the hash map
         package.set_full_address("410 S. State St.", "Salt Lake City", "Utah", "84111") # sets the full address of the package (address, city, state, zip code)
         package.set_address_w_zip("410 S State St(84111)") # sets the address with zip code of the package for use in the distance map
+        package.set_node(self.distance_map.add_addresses([package.address_w_zip])[0]) # re-resolves the node of the package's new address, adding it if it is new
+        self.eligibility.release([package_id], WRONG_ADDRESS) # the package can be loaded now that its address is correct
 
-    def get_priority_queue(self, current_time:datetime, dispatched_packages: set, truck_id: int) -> (list[tuple[int, Any]], list[Package]):
+    def get_priority_queue(self, dispatched_packages: set, truck_id: int) -> tuple[KeyedPriorityQueue, set[int]]:
         """
 
         Builds a priority queue of packages available for delivery with the following priority:
@@ -74,89 +116,113 @@ class Routing:
         3. Packages that have a deadline
         4. Packages that are not grouped with a deadline
         5. Packages that are not required for a specific truck
+        Within a priority, entries with the earliest deadline come first, then the entries closest to the hub.
+
+        Which packages are available at the current time is kept by the eligibility index, through clock events.
 
-        :param current_time: The current time of the simulation
         :param dispatched_packages: The set of packages that have already been dispatched to trucks
         :param truck_id: The id of the truck that the package is on
-        :return: A priority queue of packages available for delivery
+        :return: A priority queue of packages available for delivery, and the ids of the packages in it
         """
-        priority_queue = [] # initializes the priority queue
-        packages_in_pq = [] # this will be referenced in self.select_packages_by_priority
-        grouped = set() # initializes the set of grouped packages to avoid duplicates
+        priority_queue = KeyedPriorityQueue() # initializes the priority queue
+        packages_in_pq = set() # this will be referenced in self.select_packages_by_priority
 
-        #checks if the package is in the grouped set, has been visited, has the wrong address, is not available, or is required for another truck
-        for package in self.packages:
-            # if the package is in the grouped set, it is already being considered for delivery
-            if package.package_id in grouped:
-                continue
+        # only the eligible packages are candidates: the index already leaves out the packages that were dispatched,
+        # have not arrived, are waiting on an address fix, or are pinned to another truck
+        eligible = self.eligibility.get_eligible(truck_id)
+        self.hub_distances = self.get_hub_distances(eligible) # the distances the entries are ordered by, in one lookup
+        for pid in eligible:
             # if the package has been dispatched, it is already being delivered or has been delivered
-            if package.package_id in dispatched_packages:
-                continue
-            # if the package has a specific time it is available, and the current time is before that time, the package is not available
-            if package.available_time is not None and package.available_time > current_time:
-                continue
-            # if the package has the wrong address, and the update address time has not been reached, the package is not eligible for delivery
-            if package.wrong_address and datetime(1900,1,1,10,20) > current_time:
-                continue
-            # if the package is required for another truck, it is not eligible for delivery on this truck
-            if package.required_truck and package.required_truck != truck_id:
+            if pid in dispatched_packages:
                 continue
+            self.enqueue_package(priority_queue, packages_in_pq, self.packages[pid], truck_id)
 
+        return priority_queue, packages_in_pq
 
-            #if the package is grouped with other packages
-            if package.must_be_delivered_with:
-                priority = 4  # default priority for grouped packages without deadline
-                # iterate through the packages that must be delivered with the current package
-                for pid in package.must_be_delivered_with:
-                    package_in_group = self.packages[pid]
-                    # if any package in the group has a deadline, the priority is 2
-                    if package_in_group.deadline:
-                        priority = 2
-                group = []
-                # add all the packages in the group to the grouped set
-                for pid in package.must_be_delivered_with:
-                    groupmate = self.packages[pid]
-                    grouped.add(groupmate.package_id)
-                    group.append(groupmate.package_id)
-                    packages_in_pq.append(groupmate)
-                priority_queue.append((priority, group)) # add the grouped packages to the priority queue with the priority established above
-                continue
+    def enqueue_package(self, priority_queue: KeyedPriorityQueue, packages_in_pq: set[int], package: Package, truck_id: int) -> None:
+        """
+        Adds a package, or the group it must be delivered with, to the priority queue.
+        This is also used to add packages that become eligible after the queue was built, without rebuilding it.
 
-            # if the package is required for this truck, the priority is 1
-            if package.required_truck == truck_id:
-                priority_queue.append((1, package.package_id)) # add the package to the priority queue with the priority of 1
-                packages_in_pq.append(package)
-                continue
+        :param priority_queue: The priority queue of packages
+        :param packages_in_pq: The ids of the packages in the priority queue
+        :param package: The package to add
+        :param truck_id: The id of the truck the queue is built for
+        """
+        # if the package is already in the queue, through its group, it is already being considered for delivery
+        if package.package_id in packages_in_pq:
+            return
+
+        group = self.constraints.get_group(package.package_id) # the packages it must be delivered with, itself included
+        #if the package is grouped with other packages
+        if group:
+            priority = 4  # default priority for grouped packages without deadline
+            # iterate through the packages that must be delivered with the current package
+            for pid in group:
+                package_in_group = self.packages[pid]
+                # if any package in the group has a deadline, the priority is 2
+                if package_in_group.deadline:
+                    priority = 2
+            group = list(group)
+            packages_in_pq.update(group) # add all the packages in the group to the set of packages in the queue
+            priority_queue.push(tuple(group), group, self.get_queue_priority(priority, group)) # add the grouped packages to the priority queue with the priority established above
+            return
+
+        # if the package is required for this truck, the priority is 1
+        if self.constraints.get_required_truck(package.package_id) == truck_id:
+            priority = 1
+        # if the package has a deadline, and is not grouped with other packages, the priority is 3
+        elif package.deadline:
+            priority = 3
+        # if the package has no deadline, not required for by any truck, and is not grouped with other packages, the priority is 5
+        else:
+            priority = 5
+        packages_in_pq.add(package.package_id)
+        priority_queue.push(package.package_id, package.package_id, self.get_queue_priority(priority, [package.package_id]))
 
-            """
-            if the package has a deadline, and is not grouped with other packages, 
-            add the package to the list of packages sorted by which package has the earliest deadline
-            """
-            if package.deadline and not package.must_be_delivered_with:
-                priority_queue.append((3, package.package_id))
-                packages_in_pq.append(package)
-                continue
+    def get_queue_priority(self, priority: int, package_ids: list[int]) -> tuple[int, datetime, float]:
+        """
+        Returns the key an entry is ordered by in the priority queue: its priority, then its earliest deadline,
+        then the distance from the hub to its closest package.
 
-            # if the package has no deadline, not required for by any truck, and is not grouped with other packages, the priority is 5
-            priority_queue.append((5, package.package_id))
-            packages_in_pq.append(package)
+        :param priority: The priority of the entry
+        :param package_ids: The ids of the packages of the entry
+        """
+        packages = [self.packages[pid] for pid in package_ids]
+        deadline = min((pkg.deadline for pkg in packages if pkg.deadline), default=datetime.max) # packages without a deadline come last
+        distance = min(self.hub_distances[pkg.package_id] if pkg.package_id in self.hub_distances
+                       else self.distance_map.get_distance_by_index(self.hub, pkg.node) for pkg in packages)
+        return priority, deadline, distance
 
-        priority_queue.sort(key=lambda x: x[0], reverse=True) # sort in ascending order so more prioritized packages are first
-        return priority_queue, packages_in_pq
+    def get_hub_distances(self, package_ids: list[int]) -> dict[int, float]:
+        """
+        Returns the distance from the hub to each package, reading the nodes from the columnar copy of the packages
+        when there is one, and the distances from the distance map in one vectorized lookup.
+
+        :param package_ids: The ids of the packages
+        :return: The distance from the hub of each package, keyed by package id
+        """
+        if not package_ids:
+            return {}
+        if self.columns is not None:
+            nodes = self.columns.get_values('node', package_ids)
+        else:
+            nodes = [self.packages[pid].node for pid in package_ids]
+        return dict(zip(package_ids, self.distance_map.get_distances(self.hub, nodes).tolist()))
 
-    def select_packages_by_priority(self, priority_queue: list[tuple[int, Any]], packages_in_pq: list[Package], current_time:datetime) -> list[int]:
+    def select_packages_by_priority(self, priority_queue: KeyedPriorityQueue, packages_in_pq: set[int], current_time:datetime) -> list[int]:
         """
         Selects the packages to be delivered by the truck based on the priority of the package
         and its distance from other packages that are also being delivered
 
         :param priority_queue: The priority queue of packages
         :param current_time: The current time of the simulation
-        :param packages_in_pq: The packages that were in the original priority queue prior to popping any packages
+        :param packages_in_pq: The ids of the packages that were in the original priority queue prior to popping any packages
 
         :return: A list of packages to be delivered by the truck
         """
-        primary = [] # initializes the list of packages to be delivered by the truck
-        current_location = "HUB" # initializes the current location of the truck
+        primary: dict[int, None] = {} # initializes the packages to be delivered by the truck, in the order they were added
+        current_location = self.hub # initializes the current location of the truck
         p3_packages = [] # initializes the list of packages with a deadline
         p5_packages = [] # initializes the list of packages with no special conditions  
         mock_time = current_time # initializes the mock time of the truck
@@ -164,14 +230,14 @@ class Routing:
 
         # while the priority queue is not empty and the truck has not reached its maximum size
         while priority_queue and len(primary) < self.MAX_SIZE:
-            prio, package_id = priority_queue.pop()
+            (prio, _, _), _, package_id = priority_queue.pop()
 
-            if package_id in primary:
+            if not isinstance(package_id, list) and package_id in primary:
                 continue
 
             # if the package is required for this truck
             if prio == 1:
-                primary.append(package_id)
+                primary[package_id] = None
 
             # if the package is grouped with other packages and at least one of the packages has a deadline
             if prio == 2:
@@ -188,33 +254,33 @@ class Routing:
                     pkg = self.packages[pid]
                     # if the package has a deadline, add it to the list of packages with a deadline
                     if pkg.deadline:
-                        grouped_packages_w_deadline.append((pkg.deadline, pkg.package_id, pkg.address_w_zip))
+                        grouped_packages_w_deadline.append((pkg.deadline, pkg.package_id, pkg.node))
                 group_deliverable = True # initializes the group deliverable flag
                 local_time = mock_time # initializes the local time of the truck
                 local_location = current_location # initializes the local location of the truck
                 grouped_packages_w_deadline.sort(key=lambda x: x[0], reverse=True) # sort by earliest deadline
                 # while the list of packages with a deadline is not empty check if the packages can be delivered on time
                 while grouped_packages_w_deadline:
-                    deadline, p_id, addr_zip = grouped_packages_w_deadline.pop()
-                    eta = self.get_estimated_delivery_time(local_time, local_location, addr_zip) # gets the estimated delivery time of the package based on the current time, location, and address
+                    deadline, p_id, node = grouped_packages_w_deadline.pop()
+                    eta = self.get_estimated_delivery_time(local_time, local_location, node) # gets the estimated delivery time of the package based on the current time, location, and address
                     # if the estimated delivery time is greater than the deadline, the group is not deliverable
                     if eta > deadline:
                         group_deliverable = False
                         break
                     local_time = eta # updates the local time of the truck
-                    local_location = addr_zip # updates the local location of the truck
+                    local_location = node # updates the local location of the truck
                 # if the group is deliverable, add all the packages in the group to the list of packages to be delivered
                 if group_deliverable:
                     # iterate through the packages in the group
                     for pid in package_id:
                         # if the package is not already in the list of packages to be delivered and the truck has not reached its maximum size, add the package to the list
                         if pid not in primary and len(primary) < self.MAX_SIZE:
-                            primary.append(pid)
+                            primary[pid] = None
                     mock_time = local_time # updates the mock time of the truck
                     current_location = local_location # updates the current location of the truck
 
             # check the packages that are already in the list of packages to be delivered to see if there are packages at the same address that are not already in the list
-            for pid in primary:
+            for pid in list(primary):
                 pkg = self.packages[pid]
                 primary = self.add_siblings_to_primary(pkg, primary, packages_in_pq)
 
@@ -222,7 +288,7 @@ class Routing:
             if prio == 3:
                 pkg = self.packages[package_id] # gets the package from the hash map
                 if self.get_estimated_delivery_time(mock_time, current_location,
-                                                      pkg.address_w_zip) <= pkg.deadline:
+                                                      pkg.node) <= pkg.deadline:
                     p3_packages.append(self.packages[package_id]) # add the package to the list of packages with a deadline
 
             # if the package is not grouped with other packages, required for this truck, and has no deadline
@@ -239,10 +305,10 @@ class Routing:
             sorted_batch = self.sort_nearest_neighbors(batch, current_location) # sort the packages by the nearest neighbor
             for pkg in sorted_batch:
                 if pkg.package_id not in primary and len(primary) < self.MAX_SIZE:
-                    eta = self.get_estimated_delivery_time(mock_time, current_location, pkg.address_w_zip)
+                    eta = self.get_estimated_delivery_time(mock_time, current_location, pkg.node)
                     if eta <= pkg.deadline:
-                        primary.append(pkg.package_id)
-                        current_location = pkg.address_w_zip
+                        primary[pkg.package_id] = None
+                        current_location = pkg.node
                         mock_time = eta
                         primary = self.add_siblings_to_primary(pkg, primary, packages_in_pq)
 
@@ -253,18 +319,18 @@ class Routing:
             for pkg in sorted_p5:
                 # if the package is not already in the list of packages to be delivered, and the truck has not reached its maximum size, add the package to the list of packages to be delivered
                 if pkg.package_id not in primary and len(primary) < self.MAX_SIZE:
-                    primary.append(pkg.package_id) # add the package to the list of packages to be delivered
+                    primary[pkg.package_id] = None # add the package to the list of packages to be delivered
                     primary = self.add_siblings_to_primary(pkg, primary, packages_in_pq)
 
-        return primary
+        return list(primary)
 
-    def get_eligible_siblings(self, package: Package, primary: list[int], packages_in_pq: list[Package]) -> list[int]:
+    def get_eligible_siblings(self, package: Package, primary: dict[int, None], packages_in_pq: set[int]) -> list[int]:
         """
         Gets eligible sibling packages that can be added to the delivery list
         
         :param package: The package to find siblings for
-        :param primary: The current list of packages to be delivered
-        :param packages_in_pq: The packages that are in the priority queue
+        :param primary: The current packages to be delivered
+        :param packages_in_pq: The ids of the packages that are in the priority queue
         :return: List of eligible sibling package IDs
         """
         eligible_siblings = [] # initializes the list of eligible siblings
@@ -278,23 +344,23 @@ class Routing:
                 if (sid != package.package_id and
                     sid not in primary and
                     len(primary) < self.MAX_SIZE and # if the truck has not reached its maximum size
-                    self.packages[sid] in packages_in_pq):
+                    sid in packages_in_pq):
                     eligible_siblings.append(sid) # add the sibling to the list of eligible siblings
         return eligible_siblings
 
-    def add_siblings_to_primary(self, package: Package, primary: list[int], packages_in_pq: list[Package]) -> list[int]:
+    def add_siblings_to_primary(self, package: Package, primary: dict[int, None], packages_in_pq: set[int]) -> dict[int, None]:
         """
         Adds eligible sibling packages to the primary delivery list
         
         :param package: The package to find siblings for
-        :param primary: The current list of packages to be delivered
-        :param packages_in_pq: The packages in the priority queue
+        :param primary: The current packages to be delivered
+        :param packages_in_pq: The ids of the packages in the priority queue
         """
         eligible_siblings = self.get_eligible_siblings(package, primary, packages_in_pq) # gets the eligible siblings
         mock_primary = primary
         for sid in eligible_siblings:
             if len(mock_primary) < self.MAX_SIZE:
-                mock_primary.append(sid) # add the eligible sibling to the list of packages to be delivered
+                mock_primary[sid] = None # add the eligible sibling to the list of packages to be delivered
         return mock_primary
 
     def sort_packages_by_deadline(self, prioritized_packages: list[int]) -> tuple[list[tuple[datetime, list[Package]]], list[Package]]:
@@ -320,7 +386,7 @@ class Routing:
 
         return deadline_groups, regulars
 
-    def build_prioritized_route(self, deadline_groups: list[tuple[datetime, list[Package]]], current_time: datetime, current_location: str) -> tuple[list[Package], timedelta]:
+    def build_prioritized_route(self, deadline_groups: list[tuple[datetime, list[Package]]], current_time: datetime, current_location: int) -> tuple[list[Package], timedelta]:
         base_route = [] # initializes the list of packages to be delivered
         slack_time = timedelta(hours=24) # initializes the slack time, this is the time that the truck can be late by
 
@@ -332,133 +398,36 @@ class Routing:
             # if the deadline has only one package listed under it
             if len(group) == 1:
                 package = group[0] # get the package from the group
-                arrival_time = self.get_estimated_delivery_time(current_time, current_location, package.address_w_zip)
+                arrival_time = self.get_estimated_delivery_time(current_time, current_location, package.node)
                 slack_time = min(slack_time, (package.deadline - arrival_time)) # update the slack time
                 base_route.append(package) # add the package to the base route
-                current_location = package.address_w_zip
+                current_location = package.node
                 current_time = arrival_time
             else:
                 # Sort packages by nearest neighbor and deliver them
                 sorted_group = self.sort_nearest_neighbors(group, current_location) # sort the group by the nearest neighbor
                 for package in sorted_group:
-                    arrival_time = self.get_estimated_delivery_time(current_time, current_location, package.address_w_zip) # get the estimated delivery time of the package
+                    arrival_time = self.get_estimated_delivery_time(current_time, current_location, package.node) # get the estimated delivery time of the package
                     slack_time = min(slack_time, (package.deadline - arrival_time)) # update the slack time
                     base_route.append(package) # add the package to the base route
-                    current_location = package.address_w_zip
+                    current_location = package.node
                     current_time = arrival_time
 
         return base_route, slack_time
 
-    def find_all_feasible_insertions(self, starting_point: str | Package, base_route: list[Package], unprioritized_packages: list[Package], slack_time: timedelta) -> list[tuple[float, int, Any, Any, Package]]:
+    def insert_cheapest_packages(self, base_route: list[Package], remaining_packages: list[Package], slack_time: timedelta, current_time: datetime) -> tuple[list[Package], timedelta, list[Package]]:
         """
-        Finds all feasible insertion points for packages in the route
-        
-        :param starting_point: The starting point (HUB or Package)
-        :param base_route: The base route to insert packages into
-        :param unprioritized_packages: Packages to consider for insertion
-        :param slack_time: Available slack time for insertions
-        :return: List of feasible insertions as (time_added, counter, prev_stop, next_stop, package)
-        """
-        choices = []
-
-        for package in unprioritized_packages:
-            previous_stop = starting_point
-            time_prev_stop_to_package = None
-
-            # Check each possible insertion point in the route
-            for i, stop in enumerate(base_route):
-                # Calculate travel time from previous stop to package (only once per package)
-                if time_prev_stop_to_package is None:
-                    if isinstance(starting_point, str):
-                        time_prev_stop_to_package = self.get_travel_time("HUB", package.address_w_zip)
-                    elif isinstance(starting_point, Package):
-                        time_prev_stop_to_package = self.get_travel_time(previous_stop.address_w_zip, package.address_w_zip)
-
-                # Calculate travel time from package to next stop
-                time_package_to_next_stop = self.get_travel_time(package.address_w_zip, stop.address_w_zip)
-                # Total additional time if package is inserted here
-                time_added = time_prev_stop_to_package + time_package_to_next_stop
-
-                # Check if insertion is feasible within slack time
-                if time_added <= slack_time:
-                    # Check if insertion is beneficial (reduces total route time)
-                    should_insert = True
-                    if isinstance(previous_stop, Package):
-                        # Compare with original direct route time
-                        original_time = self.get_travel_time(previous_stop.address_w_zip, stop.address_w_zip)
-                        should_insert = time_added < original_time
-
-                    if should_insert:
-                        choices.append((time_added, stop.package_id, previous_stop, stop, package))
-
-                # Update for next iteration
-                time_prev_stop_to_package = time_package_to_next_stop
-                previous_stop = stop
-        choices.sort(key=lambda x: x[0], reverse=True)
-        return choices
-
-    def insert_best_feasible_packages(self, base_route: list[Package], insertion_heap: list[tuple[float, int, Any, Any, Package]], remaining_packages: list[Package], slack_time: timedelta) -> tuple[list[Package], timedelta, list[Package]]:
-        """
-        Inserts the best feasible packages into the route
-        
+        Inserts packages into the route by cheapest insertion until the slack time is exhausted, see InsertionEngine
+
         :param base_route: The base route to insert packages into
-        :param insertion_heap: Heap of feasible insertions
-        :param remaining_packages: Packages not yet inserted
+        :param remaining_packages: Packages to consider for insertion
         :param slack_time: Available slack time
+        :param current_time: The time the truck leaves the hub
         :return: Updated route, remaining slack time, and remaining packages
         """
-        inserted_packages = set()
-
-        while insertion_heap and slack_time > timedelta(0):  # add packages in their optimal position until the slack_time is exhausted
-            travel_time, counter, prev_stop, next_stop, package = insertion_heap.pop()
-
-            if travel_time > slack_time:
-                break
-
-            if package in inserted_packages:
-                continue
-
-            # Try to insert the package
-            insert_idx = self._find_insertion_index(base_route, prev_stop, next_stop)
-            if insert_idx is None:
-                continue
-
-            base_route.insert(insert_idx, package)
-            slack_time -= travel_time
-            remaining_packages.remove(package)
-            inserted_packages.add(package)
-
-            # Check for new feasible insertions after this insertion
-            if insert_idx + 1 < len(base_route):
-                new_inserts = self.find_all_feasible_insertions(
-                    starting_point=package, base_route=base_route,
-                    unprioritized_packages=remaining_packages, slack_time=slack_time)
-
-                for insertion in new_inserts:
-                    if insertion[4] not in inserted_packages:  # package not already inserted
-                        insertion_heap.append(insertion)
-                insertion_heap.sort(key=lambda x: x[0], reverse=True)
-
-        return base_route, slack_time, remaining_packages
-
-    def _find_insertion_index(self, base_route: list[Package], prev_stop: str | Package, next_stop: Package) -> int | None:
-        """
-        Finds the insertion index for a package between prev_stop and next_stop
-        
-        :param base_route: The base route
-        :param prev_stop: The previous stop
-        :param next_stop: The next stop
-        :return: Insertion index or None if not found
-        """
-        if prev_stop == 'HUB':
-            return 0
-        elif isinstance(prev_stop, Package):
-            for i, stop in enumerate(base_route):
-                if stop == prev_stop:
-                    # if the next stop is the next stop in the base route, return the index of the next stop
-                    if i + 1 < len(base_route) and base_route[i + 1] == next_stop:
-                        return i + 1
-        return None
+        route = Route(self.distance_map, self.hub, self.SPEED, current_time, base_route)
+        route, slack_time, remaining_packages = InsertionEngine(route, remaining_packages, slack_time).run()
+        return route.to_list(), slack_time, remaining_packages
 
     def build_regular_route(self, route: list[Package], packages_not_in_route: list[Package], current_stop: str | Package) -> list[Package]:
         """
@@ -469,87 +438,91 @@ class Routing:
         :param current_stop: Current location
         :return: Completed route
         """
-        while packages_not_in_route:
-            if isinstance(current_stop, str):
-                next_package = self.get_nearest_neighbor(packages_not_in_route, current_stop)
-            elif isinstance(current_stop, Package):
-                next_package = self.get_nearest_neighbor(packages_not_in_route, current_stop.address_w_zip)
-            else:
-                break
+        if isinstance(current_stop, str):
+            start_location = self.distance_map.get_index(current_stop)
+        elif isinstance(current_stop, Package):
+            start_location = current_stop.node
+        else:
+            return route
 
-            route.append(next_package)
-            current_stop = next_package
-            packages_not_in_route.remove(next_package)
+        route.extend(self.sort_nearest_neighbors(packages_not_in_route, start_location)) # walks the neighbor index from the current stop
+        packages_not_in_route.clear()
         return route
 
-    def get_mock_completion_time_and_distance(self, route: list[Package | str], current_time: datetime, current_location: str) -> tuple[datetime, float]:
+    def get_mock_completion_time_and_distance(self, route: list[Package | str], current_time: datetime, current_location: int) -> tuple[datetime, float]:
         """
         Calculates the completion time and total distance for a route
         
         :param route: The route to calculate
         :param current_time: Starting time
-        :param current_location: Starting location
+        :param current_location: Node of the starting location
         :return: Completion time and total distance
         """
         distance_travelled = 0.0
 
         for stop in route:
             if isinstance(stop, Package):
-                stop_address = stop.address_w_zip
+                stop_node = stop.node
             elif isinstance(stop, str):
-                stop_address = stop
+                stop_node = self.distance_map.get_index(stop)
             else:
                 continue
 
-            distance = self.distance_map.get_distance(current_location, stop_address)
-            travel_time = self.get_travel_time(current_location, stop_address)
+            distance = self.distance_map.get_distance_by_index(current_location, stop_node)
+            travel_time = self.get_travel_time(current_location, stop_node)
             distance_travelled += distance
             current_time += travel_time
-            current_location = stop_address
+            current_location = stop_node
 
         # Add return to HUB
-        distance = self.distance_map.get_distance(current_location, "HUB")
-        travel_time = self.get_travel_time(current_location, "HUB")
+        distance = self.distance_map.get_distance_by_index(current_location, self.hub)
+        travel_time = self.get_travel_time(current_location, self.hub)
         distance_travelled += distance
         current_time += travel_time
 
         return current_time, distance_travelled
 
-    def get_nearest_neighbor(self, packages: list[Package], current_location: str) -> Package | None:
-        """
-        Finds the nearest neighbor package from current location
-        
-        :param packages: List of packages to search
-        :param current_location: Current location
-        :return: Nearest package or None if no packages
-        """
-        if not packages:
-            return None
-
-        nearest_neighbor = min(packages, key=lambda pkg: self.distance_map.get_distance(current_location, pkg.address_w_zip))
-        return nearest_neighbor
-
-    def sort_nearest_neighbors(self, pkgs: list[Package], start_location: str) -> list[Package]:
+    def sort_nearest_neighbors(self, pkgs: list[Package], start_location: int) -> list[Package]:
         """
-        Sorts packages by nearest neighbor algorithm
+        Sorts packages by nearest neighbor algorithm, walking the precomputed neighbor list of each stop
+        and skipping the stops that are already in the route
         
         :param pkgs: List of packages to sort
-        :param start_location: Starting location
+        :param start_location: Node of the starting location
         :return: Sorted list of packages
         """
         route = []
         current = start_location
-        to_visit = set(pkgs)
+        packages_at_node: dict[int, deque[Package]] = {} # the packages not yet in the route, grouped by the node of their address
+        for pkg in dict.fromkeys(pkgs): # removes duplicate packages while keeping their order
+            packages_at_node.setdefault(pkg.node, deque()).append(pkg)
+        remaining = sum(len(queue) for queue in packages_at_node.values())
+        cursors: dict[int, int] = {} # for each node, the position in its neighbor list before which every node is already visited
+
+        while remaining:
+            neighbors = self.distance_map.get_neighbors(current)
+            position = cursors.get(current, 0)
+            # skip the neighbors whose packages are all in the route already, visited nodes never become unvisited again
+            while position < len(neighbors) and not packages_at_node.get(neighbors[position]):
+                position += 1
+            cursors[current] = position
+
+            if position < len(neighbors):
+                nearest_node = neighbors[position]
+            else:
+                # the neighbor list is bounded and exhausted, fall back to a vectorized scan of the remaining nodes,
+                # in matrix order so that ties are broken the same way as in the neighbor list
+                candidates = sorted(node for node, queue in packages_at_node.items() if queue)
+                nearest_node = candidates[self.distance_map.argmin_distance(current, candidates)]
 
-        while to_visit:
-            nearest = min(to_visit, key=lambda pkg: self.get_travel_time(current, pkg.address_w_zip))
+            nearest = packages_at_node[nearest_node].popleft()
             route.append(nearest)
-            current = nearest.address_w_zip
-            to_visit.remove(nearest)
+            current = nearest_node
+            remaining -= 1
         return route
 
     def sort_packages(self, prioritized_packages: list[int], current_time: datetime, dispatched_packages: set) -> tuple[list[Package], datetime, float, set[int]]:
-        current_location = "HUB"
+        current_location = self.hub
         dispatched_packages = dispatched_packages.union(prioritized_packages)
 
         deadline_groups, regular_packages = self.sort_packages_by_deadline(prioritized_packages)
@@ -569,13 +542,9 @@ class Routing:
                             prioritized_route.insert(index+1, sibling)
                             regular_packages.remove(sibling)
 
-            # add the packages that have potential to be fit in between the expedited packages
-            potential_package_insertions = self.find_all_feasible_insertions("HUB", prioritized_route,
-                                                                             regular_packages, slack_time)
-
-            base_route, new_slack_time, packages_not_in_route = (self.insert_best_feasible_packages
-                                                                 (prioritized_route, potential_package_insertions,
-                                                                  regular_packages, slack_time))
+            # add the packages that fit in between the expedited packages
+            base_route, new_slack_time, packages_not_in_route = self.insert_cheapest_packages(prioritized_route, regular_packages,
+                                                                                              slack_time, current_time)
 
             current_stop = base_route[-1]
 
@@ -586,7 +555,7 @@ class Routing:
             completed_route = self.build_regular_route(route=[], packages_not_in_route=regular_packages,
                                                        current_stop="HUB")
 
-        completed_time, miles_travelled = self.get_mock_completion_time_and_distance(completed_route, current_time, "HUB")
+        completed_time, miles_travelled = self.get_mock_completion_time_and_distance(completed_route, current_time, self.hub)
 
         return completed_route, completed_time, miles_travelled, dispatched_packages
 
@@ -599,9 +568,19 @@ class Routing:
         :param dispatched_packages: The packages that have been dispatched
         :return: The completed route, the completion time, the miles travelled, and the dispatched packages
         """
-        priority_queue, packages_in_pq = self.get_priority_queue(current_time, dispatched_packages, route_id)
+        priority_queue, packages_in_pq = self.get_priority_queue(dispatched_packages, route_id)
         priorities = self.select_packages_by_priority(priority_queue, packages_in_pq, current_time)
         final_route, final_time, final_miles_travelled, final_dispatched_packages = self.sort_packages(priorities, current_time, dispatched_packages)
 
+        # sequences the route exactly when it has few enough stops (optimal on a metric closure, see HeldKarpSolver),
+        # otherwise, or if no order meets every deadline, shortens it with 2-opt, Or-opt and relocate moves
+        improved_route = self.exact_solver.solve(final_route, current_time)
+        if improved_route is None:
+            improved_route = self.local_search.optimize(final_route, current_time)
+        if improved_route != final_route:
+            final_route = improved_route
+            final_time, final_miles_travelled = self.get_mock_completion_time_and_distance(final_route, current_time, self.hub)
+        self.eligibility.dispatch(priorities) # the packages of the route leave the eligibility index
+
         return final_route, final_time, final_miles_travelled, final_dispatched_packages
 
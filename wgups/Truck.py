@@ -3,9 +3,9 @@ from collections import deque
 from typing import List, Optional
 
 import csv
-from datetime import datetime, time, timedelta
+from datetime import datetime, time
 
-from wgups.Routing import Routing
+from wgups.Routing import SPEED, Routing
 from wgups.SimulationClock import SimulationClock
 from wgups.Package import TruckCarrier, PackageStatus
 from wgups.dataloader.PackageLoader import PackageLoader
@@ -20,22 +20,27 @@ class Truck:
     The truck manages package loading, delivery, and route execution.
     It tracks its location, distance traveled, and delivery status.
     """
-    def __init__(self, truck_id: int = 0, distance_map: Optional[DistanceMap] = None, clock: Optional[SimulationClock] = None):
+    def __init__(self, truck_id: int = 0, distance_map: Optional[DistanceMap] = None, clock: Optional[SimulationClock] = None,
+                 speed: float = SPEED):
         """
         Initializes a Truck object.
         
         :param truck_id: The ID of the truck (1, 2, or 3)
         :param distance_map: The distance map for calculating travel times
         :param clock: The simulation clock for scheduling events
+        :param speed: The average speed of the truck in miles per hour
         """
         self.packages_in_truck = [] # Queue of packages to be delivered
         self.delivery_log = []  # List of delivered packages for tracking
         self.truck_id = truck_id
         self.CAPACITY = 16
-        self.SPEED = 18.0
+        self.SPEED = speed
         self.distance_map = distance_map
         self.clock = clock
         self.location = 'HUB'  # Current location, starts at HUB
+        self.hub = distance_map.get_index('HUB') if distance_map else None  # Node of the HUB within the distance map
+        self.node = self.hub  # Node of the current location, used for distance lookups
+        self.travel_times = distance_map.get_travel_times(self.SPEED) if distance_map else None  # Travel time between every pair of nodes
         self.distance_travelled = 0.0  # Total distance traveled in miles
 
     def load_packages(self, packages: List[Package]) -> list:
@@ -107,11 +112,12 @@ class Truck:
 
         package = self.packages_in_truck[index]
         # Calculate distance and travel time to package destination
-        dist = self.distance_map.get_distance(self.location, package.address_w_zip)
+        dist = self.distance_map.get_distance_by_index(self.node, package.node)
         self.distance_travelled += dist
-        travel_time = timedelta(hours=dist / 18.0)  # 18 mph average speed
+        travel_time = self.travel_times.get(self.node, package.node)  # precomputed at the truck's average speed
         delivery_time = self.clock.now() + travel_time
-        self.location = package.address_w_zip  # Update truck location
+        self.node = package.node  # Update truck location
+        self.location = package.address_w_zip
 
         # Mark package as delivered and record delivery time
         package.set_status(PackageStatus.DELIVERED)
@@ -140,15 +146,16 @@ class Truck:
         
         :return: Status message indicating truck location
         """
-        if self.location == 'HUB':
+        if self.node == self.hub:
             return "truck is already at HUB"
         
         # Calculate distance and travel time back to HUB
-        dist = self.distance_map.get_distance('HUB', self.location)
-        travel_time = timedelta(hours=dist / 18.0)  # 18 mph average speed
+        dist = self.distance_map.get_distance_by_index(self.hub, self.node)
+        travel_time = self.travel_times.get(self.node, self.hub)  # precomputed at the truck's average speed
         finish_time = self.clock.now() + travel_time
         self.distance_travelled += dist
-        self.location = 'HUB'  # Update truck location to HUB
+        self.node = self.hub  # Update truck location to HUB
+        self.location = 'HUB'
 
         self.delivery_log.append(
             (finish_time, self.distance_travelled, "HUB", self.location))  # Add to delivery log for tracking
@@ -0,0 +1,134 @@
+from collections.abc import Iterable
+from typing import Optional
+
+from wgups.Package import Package
+
+
+class DisjointSet:
+    """
+    Union-find over package ids, with union by size and path halving.
+    """
+    def __init__(self):
+        self.parent: dict[int, int] = {} # maps each id to its parent, roots map to themselves
+        self.size: dict[int, int] = {} # the size of the set under each root
+
+    def add(self, item: int) -> None:
+        """
+        Adds an item as its own set if it is not already in a set.
+        """
+        if item not in self.parent:
+            self.parent[item] = item
+            self.size[item] = 1
+
+    def find(self, item: int) -> int:
+        """
+        Returns the root of the set that contains the item.
+        """
+        self.add(item)
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]] # halves the path on the way up
+            item = parent[item]
+        return item
+
+    def union(self, a: int, b: int) -> int:
+        """
+        Merges the sets that contain a and b and returns the root of the merged set.
+        """
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a # attaches the smaller set under the larger one
+        self.size[root_a] += self.size.pop(root_b)
+        return root_a
+
+
+class ConstraintGraph:
+    """
+    This class is used to store the delivery constraints between packages:
+    the groups of packages that must be delivered together, the packages that share an address,
+    and the packages that can only be on a specific truck.
+
+    It is built in one pass over the packages, and every query is a dictionary lookup.
+    """
+    def __init__(self):
+        self.groups = DisjointSet() # co-delivery groups, merged transitively
+        self.group_members: dict[int, set[int]] = {} # root id -> the ids of every package in the group
+        self.address_siblings: dict[str, list[int]] = {} # address -> the ids of the packages delivered there, in load order
+        self.required_trucks: dict[int, int] = {} # package id -> the truck the package can only be on
+        self.group_trucks: dict[int, int] = {} # root id -> the truck every package of the group is pinned to through one member
+
+    @classmethod
+    def from_packages(cls, packages: Iterable[Package]) -> 'ConstraintGraph':
+        """
+        Builds the constraint graph from the packages in one pass.
+        """
+        graph = cls()
+        for package in packages:
+            graph.add_package(package)
+        graph.build_group_members()
+        return graph
+
+    def add_package(self, package: Package) -> None:
+        """
+        Adds the constraints of a package to the graph.
+        """
+        package_id = package.package_id
+        self.address_siblings.setdefault(package.address, []).append(package_id)
+
+        if package.must_be_delivered_with:
+            for other_id in package.must_be_delivered_with:
+                self.groups.union(package_id, other_id)
+
+        if package.required_truck is not None:
+            self.required_trucks[package_id] = package.required_truck
+
+    def build_group_members(self) -> None:
+        """
+        Collects the members of every co-delivery group and the truck the group is pinned to, if any.
+
+        :raises ValueError: if two packages of the same group are pinned to different trucks
+        """
+        self.group_members = {}
+        for item in self.groups.parent:
+            self.group_members.setdefault(self.groups.find(item), set()).add(item)
+
+        self.group_trucks = {}
+        for package_id, truck in self.required_trucks.items():
+            if package_id not in self.groups.parent:
+                continue
+            root = self.groups.find(package_id)
+            if self.group_trucks.setdefault(root, truck) != truck:
+                raise ValueError(f"Packages in the group of package {package_id} are pinned to different trucks")
+
+    def get_group(self, package_id: int) -> Optional[set[int]]:
+        """
+        Returns the ids of the packages that must be delivered with the package, itself included,
+        or None if the package is not in a group.
+        """
+        if package_id not in self.groups.parent:
+            return None
+        return self.group_members[self.groups.find(package_id)]
+
+    def get_groups(self) -> list[set[int]]:
+        """
+        Returns every co-delivery group.
+        """
+        return list(self.group_members.values())
+
+    def get_siblings(self, address: str) -> list[int]:
+        """
+        Returns the ids of the packages delivered to the address.
+        """
+        return self.address_siblings.get(address, [])
+
+    def get_required_truck(self, package_id: int) -> Optional[int]:
+        """
+        Returns the truck the package must be on, either because of its own note or because of a member of its group.
+        """
+        truck = self.required_trucks.get(package_id)
+        if truck is None and package_id in self.groups.parent:
+            truck = self.group_trucks.get(self.groups.find(package_id))
+        return truck
@@ -0,0 +1,168 @@
+import csv
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Protocol
+
+from wgups.datastore.CoordinateOracle import normalize_address
+
+Coordinates = tuple[Optional[float], Optional[float]] # (latitude, longitude), (None, None) if the address was not found
+
+
+class Geocoder(Protocol):
+    """
+    A geocoding backend, which returns the coordinates of one address.
+    """
+    def geocode(self, address: str) -> Coordinates:
+        ...
+
+
+class NominatimGeocoder:
+    """
+    Geocodes addresses with the OpenStreetMap Nominatim service through geopy.
+    """
+    def __init__(self, user_agent: str = "wgups-routing-batch", timeout: int = 10):
+        from geopy.geocoders import Nominatim # only needed when geocoding online
+        self.geolocator = Nominatim(user_agent=user_agent) # custom user_agent per Nominatim policy
+        self.timeout = timeout
+
+    def geocode(self, address: str) -> Coordinates:
+        try:
+            location = self.geolocator.geocode(address, timeout=self.timeout)
+            if location:
+                return location.latitude, location.longitude
+            return None, None
+        except Exception:
+            return None, None
+
+
+class LocalGeocoder:
+    """
+    Geocodes addresses from a table of known coordinates, for offline runs and tests.
+    """
+    def __init__(self, coordinates: dict[str, tuple[float, float]]):
+        self.coordinates = {normalize_address(address): latlon for address, latlon in coordinates.items()}
+
+    @classmethod
+    def from_csv(cls, file: str, address_column: str = "FullAddress",
+                 latitude_column: str = "Latitude", longitude_column: str = "Longitude") -> 'LocalGeocoder':
+        """
+        Builds the table from a csv file with address, latitude and longitude columns, such as packages_with_coords.csv.
+        """
+        coordinates = {}
+        with open(file, 'r') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if row.get(latitude_column) and row.get(longitude_column):
+                    coordinates[row[address_column]] = (float(row[latitude_column]), float(row[longitude_column]))
+        return cls(coordinates)
+
+    def geocode(self, address: str) -> Coordinates:
+        return self.coordinates.get(normalize_address(address), (None, None))
+
+
+class TokenBucket:
+    """
+    Rate limiter shared by the geocoding threads: each request takes a token,
+    and tokens refill at rate per second up to capacity.
+    """
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Blocks until a token is available and takes it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GeocodeCache:
+    """
+    Persistent SQLite cache of coordinates, keyed on the normalized address.
+    Only addresses that were found are stored, so misses are retried on the next run.
+    """
+    def __init__(self, file: str):
+        self.connection = sqlite3.connect(file)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS geocodes (address TEXT PRIMARY KEY, latitude REAL, longitude REAL)")
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, tuple[float, float]]:
+        """
+        Returns the cached coordinates of the keys that are in the cache.
+        """
+        found = {}
+        for key in keys:
+            row = self.connection.execute(
+                "SELECT latitude, longitude FROM geocodes WHERE address = ?", (key,)).fetchone()
+            if row is not None:
+                found[key] = row
+        return found
+
+    def put_many(self, coordinates: dict[str, tuple[float, float]]) -> None:
+        """
+        Stores the coordinates of the keys.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO geocodes (address, latitude, longitude) VALUES (?, ?, ?)",
+                [(key, lat, lon) for key, (lat, lon) in coordinates.items()])
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class GeocodingPipeline:
+    """
+    Geocodes a list of addresses: each distinct normalized address is looked up once, the cache answers the
+    known ones, and the rest are sent to the geocoder by a pool of threads under a shared rate limit.
+    """
+    def __init__(self, geocoder: Geocoder, cache: Optional[GeocodeCache] = None,
+                 rate: float = 1.0, workers: int = 4):
+        """
+        :param geocoder: the backend used for the addresses that are not cached
+        :param cache: the persistent cache, None disables caching
+        :param rate: the maximum number of geocoder requests per second
+        :param workers: the number of concurrent requests
+        """
+        self.geocoder = geocoder
+        self.cache = cache
+        self.limiter = TokenBucket(rate)
+        self.workers = workers
+
+    def fetch(self, address: str) -> Coordinates:
+        self.limiter.acquire()
+        return self.geocoder.geocode(address)
+
+    def geocode_all(self, addresses: list[str]) -> list[Coordinates]:
+        """
+        Returns the coordinates of every address, in the same order as the addresses.
+        """
+        originals: dict[str, str] = {} # one original spelling per normalized address
+        for address in addresses:
+            originals.setdefault(normalize_address(address), address)
+
+        results: dict[str, Coordinates] = dict(self.cache.get_many(originals)) if self.cache else {}
+        missing = [key for key in originals if key not in results]
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                fetched = dict(zip(missing, pool.map(self.fetch, [originals[key] for key in missing])))
+            results.update(fetched)
+            if self.cache:
+                self.cache.put_many({key: latlon for key, latlon in fetched.items() if latlon[0] is not None})
+
+        return [results[normalize_address(address)] for address in addresses]
@@ -1,40 +1,36 @@
+import os
+import sys
+
 import pandas as pd
-from geopy.geocoders import Nominatim
-from time import sleep
+
+from wgups.dataloader.Geocoding import GeocodeCache, GeocodingPipeline, LocalGeocoder, NominatimGeocoder
+
+# Run with python -m wgups.dataloader.Loader from the repository root; paths are relative to this file
+HERE = os.path.dirname(os.path.abspath(__file__))
 
 # Load your CSV data
-df = pd.read_csv("../../data/packages.csv")
+df = pd.read_csv(os.path.join(HERE, "../../data/packages.csv"))
 
 # Build full address strings
 df["FullAddress"] = df["Address"] + ", " + df["City"] + ", " + df["State"] + " " + df["Zip"].astype(str)
 
-# Initialize geocoder (with custom user_agent per Nominatim policy)
-geolocator = Nominatim(user_agent="wgups-routing-batch")
-
-# Functions to geocode with some rate limiting to avoid bans
-def geocode_address(address):
-    try:
-        location = geolocator.geocode(address, timeout=10)
-        if location:
-            return location.latitude, location.longitude
-        return None, None
-    except Exception:
-        return None, None
-
-# Apply to your DataFrame
-latitudes = []
-longitudes = []
+# Pass --offline <csv> to geocode from a file of known coordinates instead of Nominatim
+if len(sys.argv) > 2 and sys.argv[1] == "--offline":
+    geocoder = LocalGeocoder.from_csv(sys.argv[2])
+else:
+    geocoder = NominatimGeocoder(user_agent="wgups-routing-batch")
 
-for address in df["FullAddress"]:
-    lat, lon = geocode_address(address)
-    latitudes.append(lat)
-    longitudes.append(lon)
-    sleep(1)  # Nominatim requests 1-second delay per their usage policy!
+# Addresses geocoded by an earlier run are read from the cache, and each distinct address is requested once.
+# Nominatim requests at most 1 request per second per their usage policy!
+cache = GeocodeCache(os.path.join(HERE, "geocode_cache.sqlite"))
+pipeline = GeocodingPipeline(geocoder, cache, rate=1.0, workers=4)
+coordinates = pipeline.geocode_all(df["FullAddress"].tolist())
+cache.close()
 
-df["Latitude"] = latitudes
-df["Longitude"] = longitudes
+df["Latitude"] = [lat for lat, lon in coordinates]
+df["Longitude"] = [lon for lat, lon in coordinates]
 
 # Save to new CSV for easy reuse in Streamlit/etc.
-df.to_csv("packages_with_coords.csv", index=False)
+df.to_csv(os.path.join(HERE, "packages_with_coords.csv"), index=False)
 
-print("Done! Coordinates added.")
\ No newline at end of file
+print("Done! Coordinates added.")
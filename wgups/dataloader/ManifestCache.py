@@ -0,0 +1,179 @@
+import hashlib
+import os
+import pickle
+from typing import Any, Optional
+
+import numpy as np
+
+from wgups.Package import Package
+from wgups.dataloader.ConstraintGraph import ConstraintGraph
+from wgups.dataloader.PackageLoader import PackageLoader
+from wgups.datastore.CoordinateOracle import CoordinateOracle
+from wgups.datastore.DistanceMap import DistanceMap
+from wgups.datastore.PackageHashMap import PackageHashMap
+
+CACHE_VERSION = 3 # bumped whenever the layout of the cached data changes
+PACKAGE_FIELDS = tuple(name for name in Package.__slots__ if name != 'on_change') # the listener is rebuilt by the hash map
+
+
+def file_signature(file: str) -> tuple[int, int]:
+    """
+    Returns the modification time and size of a file, which are checked before hashing it.
+    """
+    stat = os.stat(file)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_hash(file: str) -> str:
+    """
+    Returns the sha256 of the contents of a file.
+    """
+    digest = hashlib.sha256()
+    with open(file, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ManifestCache:
+    """
+    This class is used to cache the fully parsed packages, constraint graph and distance map in one binary file,
+    so that later launches skip parsing the csv files and rebuilding the groups and shared addresses.
+
+    The cache is keyed on the modification time, size and sha256 of each source file. When the modification time
+    or size differ, the contents are hashed, so touching a file without changing it does not rebuild the cache.
+    It is also keyed on the fingerprint of the coordinate oracle, since the oracle decides the nodes of the packages
+    whose addresses are missing from the distance file.
+    """
+    def __init__(self, packages_file: str, distances_file: str, cache_file: Optional[str] = None, metric_closure: bool = False,
+                 oracle: Optional[CoordinateOracle] = None):
+        """
+        Initializes the ManifestCache class.
+
+        :param packages_file: the package csv file
+        :param distances_file: the distance csv or binary file
+        :param cache_file: where the cache is stored, by default beside the package file
+        :param metric_closure: whether the distance map is loaded with its metric closure
+        :param oracle: estimates the distances of the addresses missing from the distance file, set on the distance map
+            before the packages are resolved to their nodes
+        """
+        self.packages_file = packages_file
+        self.distances_file = distances_file
+        self.cache_file = cache_file or os.path.join(os.path.dirname(packages_file), '.manifest_cache.pickle')
+        self.metric_closure = metric_closure
+        self.oracle = oracle
+        self.oracle_fingerprint = oracle.get_fingerprint() if oracle else None # taken before the oracle is calibrated
+        self.constraints: Optional[ConstraintGraph] = None # the constraint graph of the last load
+        self.hit = False # whether the last load came from the cache
+
+    def sources(self) -> list[str]:
+        return [self.packages_file, self.distances_file]
+
+    def load(self, package_hash_map: PackageHashMap) -> tuple[PackageHashMap, DistanceMap]:
+        """
+        Loads the packages into the hash map and returns it with the distance map,
+        from the cache if it matches the source files, otherwise from the source files, writing a new cache.
+        """
+        cached = self.read_cache()
+        if cached is not None:
+            self.hit = True
+            return self.restore(cached, package_hash_map)
+
+        self.hit = False
+        distance_map = DistanceMap(self.distances_file, metric_closure=self.metric_closure)
+        if self.oracle is not None:
+            distance_map.set_oracle(self.oracle) # the missing addresses are estimated while the nodes are resolved
+        loader = PackageLoader(self.packages_file, package_hash_map, distance_map)
+        self.constraints = loader.constraints
+        self.write_cache(loader.get_map(), distance_map, loader.constraints)
+        return loader.get_map(), distance_map
+
+    def read_cache(self) -> Optional[dict[str, Any]]:
+        """
+        Returns the cached data if the cache exists and matches the source files, otherwise None.
+        """
+        try:
+            with open(self.cache_file, 'rb') as cache:
+                cached = pickle.load(cache)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+        if cached.get('version') != CACHE_VERSION or cached.get('metric_closure') != self.metric_closure:
+            return None
+        if cached.get('oracle') != self.oracle_fingerprint:
+            return None
+        keys = cached.get('sources', [])
+        if [key[0] for key in keys] != self.sources():
+            return None
+
+        refreshed = False
+        for i, (file, signature, digest) in enumerate(keys):
+            try:
+                current_signature = file_signature(file)
+            except OSError:
+                return None
+            if current_signature == signature:
+                continue
+            if file_hash(file) != digest: # the file changed
+                return None
+            keys[i] = (file, current_signature, digest) # the file was only touched
+            refreshed = True
+
+        if refreshed:
+            self.dump(cached)
+        return cached
+
+    def write_cache(self, package_hash_map: PackageHashMap, distance_map: DistanceMap, constraints: ConstraintGraph) -> None:
+        """
+        Writes the parsed packages, constraint graph and distance map to the cache file.
+        """
+        self.dump({
+            'version': CACHE_VERSION,
+            'metric_closure': self.metric_closure,
+            'oracle': self.oracle_fingerprint,
+            'sources': [(file, file_signature(file), file_hash(file)) for file in self.sources()],
+            'packages': [tuple(getattr(package, name) for name in PACKAGE_FIELDS) for package in package_hash_map],
+            'constraints': constraints,
+            'addresses': distance_map.addresses,
+            'triangle': np.asarray(distance_map.get_triangle()),
+            'shortened_pairs': distance_map.shortened_pairs,
+            'estimated': distance_map.estimated,
+            'road_factor': self.oracle.road_factor if self.oracle else None,
+        })
+
+    def dump(self, cached: dict[str, Any]) -> None:
+        """
+        Writes the data to the cache file atomically, so an interrupted write never leaves a broken cache.
+        A cache that cannot be written is skipped.
+        """
+        temporary_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_file, 'wb') as cache:
+                pickle.dump(cached, cache, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_file, self.cache_file)
+        except OSError:
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+
+    def restore(self, cached: dict[str, Any], package_hash_map: PackageHashMap) -> tuple[PackageHashMap, DistanceMap]:
+        """
+        Rebuilds the hash map and distance map from the cached data.
+        """
+        packages = []
+        for values in cached['packages']:
+            package = Package.__new__(Package)
+            for name, value in zip(PACKAGE_FIELDS, values):
+                setattr(package, name, value)
+            package.on_change = None
+            packages.append(package)
+        package_hash_map.add_packages(packages, expected_count=len(packages))
+
+        self.constraints = cached['constraints']
+        distance_map = DistanceMap.from_triangle(self.distances_file, cached['addresses'], cached['triangle'],
+                                                 self.metric_closure, cached['shortened_pairs'])
+        distance_map.estimated = set(cached['estimated'])
+        if self.oracle is not None:
+            if self.oracle.road_factor is None:
+                self.oracle.road_factor = cached['road_factor'] # calibrated on the map before the estimated addresses were added
+            distance_map.set_oracle(self.oracle)
+        return package_hash_map, distance_map
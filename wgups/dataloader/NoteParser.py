@@ -0,0 +1,90 @@
+"""
+Parsers for the deadline and special note columns of the package csv file.
+
+The patterns are compiled once, and the results are memoized per distinct string,
+since a manifest repeats the same few deadlines and notes across many rows.
+"""
+
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+TRUCK_PATTERN = re.compile(r'truck\s*(\d+)')
+TIME_PATTERN = re.compile(r'\b(\d{1,2}):(\d{2})\s*(am|pm)\b', re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r'\d+')
+CACHE_SIZE = 1024 # the number of distinct strings memoized by each parser
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_clock_time(hour: str, minute: str, meridiem: str) -> datetime:
+    """
+    Returns the time as a datetime on 1900-01-01, the same as datetime.strptime with '%I:%M %p'.
+
+    :raises ValueError: if the hour or minute is out of range
+    """
+    hour_value, minute_value = int(hour), int(minute)
+    if not 1 <= hour_value <= 12 or not 0 <= minute_value <= 59:
+        raise ValueError(f'Invalid time: {hour}:{minute} {meridiem}')
+    hour_value %= 12 # 12 am is midnight and 12 pm is noon
+    if meridiem.lower() == 'pm':
+        hour_value += 12
+    return datetime(1900, 1, 1, hour_value, minute_value)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_deadline(deadline_str: str) -> Optional[datetime]:
+    """
+    Parses a deadline such as '10:30 AM' and returns a datetime object, or None for 'EOD'.
+
+    :raises ValueError: if the deadline is not a time or 'EOD'
+    """
+    deadline_str = deadline_str.strip()
+    # if the deadline is EOD, return None
+    if deadline_str.upper() == 'EOD':
+        return None
+
+    match = TIME_PATTERN.fullmatch(deadline_str)
+    if match is None:
+        raise ValueError('Invalid deadline string')
+    try:
+        return parse_clock_time(*match.groups())
+    except ValueError:
+        raise ValueError('Invalid deadline string')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_note(note_str: str) -> tuple[Optional[int], Optional[datetime], Optional[tuple[int, ...]], bool]:
+    """
+    Parses a special note and returns (required truck, available time, grouped package ids, wrong address).
+    The grouped package ids are a tuple since the result is shared between every row with the same note.
+    """
+    note_str = note_str.lower() # converts the note to lowercase
+    required_truck = None
+    available_time = None
+    grouped_packages = None
+    wrong_address = False
+
+    # if the note contains the word "truck", parse the truck number
+    if "truck" in note_str:
+        match = TRUCK_PATTERN.search(note_str)
+        if match:
+            required_truck = int(match.group(1))
+
+    # if the note contains the word "delayed", parse the time the package arrives at the hub
+    if "delayed" in note_str:
+        match = TIME_PATTERN.search(note_str)
+        if match:
+            available_time = parse_clock_time(*match.groups())
+
+    # if the note contains the words "must be delivered with", parse the package ids
+    if "must be delivered with" in note_str:
+        match = NUMBER_PATTERN.findall(note_str)
+        if match:
+            grouped_packages = tuple(map(int, match))
+
+    # if the note contains the words "wrong address", the address of the package is wrong
+    if "wrong address" in note_str:
+        wrong_address = True
+
+    return required_truck, available_time, grouped_packages, wrong_address
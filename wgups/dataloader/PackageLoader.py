@@ -1,11 +1,27 @@
-import re
 from collections import defaultdict
 
+from wgups.dataloader import NoteParser
+from wgups.dataloader.ConstraintGraph import ConstraintGraph
+from wgups.datastore.DistanceMap import DistanceMap
 from wgups.datastore.PackageHashMap import PackageHashMap
 from wgups.Package import Package, PackageStatus
 from datetime import datetime
 from typing import Optional
 
+# a parsed csv row: (package id, address, city, state, zip code, deadline, weight, note,
+#                    required truck, available time, grouped package ids, wrong address)
+PackageRecord = tuple[int, str, str, str, str, Optional[datetime], float, str,
+                      Optional[int], Optional[datetime], Optional[tuple[int, ...]], bool]
+
+
+def row_to_record(row: list[str]) -> PackageRecord:
+    """
+    Parses a row from the csv file into a compact record of plain values, which can be sent between processes.
+    """
+    required_truck, available_time, grouped_packages, wrong_address = NoteParser.parse_note(row[7])
+    return (int(row[0]), row[1], row[2], row[3], row[4], NoteParser.parse_deadline(row[5]), float(row[6]), row[7],
+            required_truck, available_time, grouped_packages, wrong_address)
+
 
 class PackageLoader:
     """
@@ -15,18 +31,21 @@ class PackageLoader:
     It also has methods to get the map of the packages.
     It also has methods to build the groups and shared addresses.
     """
-    def __init__(self, file:str, package_hash_map:PackageHashMap):
+    def __init__(self, file:str, package_hash_map:PackageHashMap, distance_map: Optional[DistanceMap] = None):
         """
         Initializes the PackageLoader class.
+        If a distance map is given, the address of every package is resolved to its node in the distance map.
         """
         self.file = file
         self.package_hash_map = package_hash_map # the hash map of the packages
-
-        self.address_groups = []
+        self.distance_map = distance_map # the distance map used to resolve the nodes of the packages
 
         self.load_from_file() # loads the packages from the csv file
+        self.constraints = ConstraintGraph.from_packages(self.package_hash_map) # the co-delivery groups, shared addresses and truck pins, built in one pass
         self.build_groups() # builds the groups of packages
         self.build_shared_addresses() # builds the shared addresses of packages
+        if self.distance_map is not None:
+            self.resolve_nodes() # resolves the address of every package to its node in the distance map
 
 
     def load_from_file(self) -> Optional[PackageHashMap]:
@@ -37,34 +56,31 @@ class PackageLoader:
         with open(self.file, 'r') as csvfile:
             reader = csv.reader(csvfile, delimiter=',')
             next(reader)
-            for row in reader:
-                if row:
-                    self.package_hash_map.add_package(self.csv_to_package(row=row)) # adds the package to the hash map
+            packages = [self.csv_to_package(row=row) for row in reader if row] # converts every row to a package
+            self.package_hash_map.add_packages(packages, expected_count=len(packages)) # adds the packages to the hash map, sizing it once
             return self.package_hash_map
 
     def csv_to_package(self, row: list[str]) -> Package:
         """
         Converts a row from the csv file to a package.
         """
-        package_id = int(row[0])
-        address = row[1]
-        city = row[2]
-        state = row[3]
-        zip_code = row[4]
-        deadline = self.parse_deadline(row[5]) # parses the deadline from the csv file and returns a datetime object
-        weight = float(row[6]) 
-        required_truck, available_time, grouped_packages, wrong_address = self.parse_note(row[7])
+        return self.record_to_package(row_to_record(row))
+
+    def record_to_package(self, record: PackageRecord) -> Package:
+        """
+        Converts a parsed record to a package.
+        """
+        (package_id, address, city, state, zip_code, deadline, weight, note,
+         required_truck, available_time, grouped_packages, wrong_address) = record
         status = PackageStatus.NOT_READY # sets the status of the package to not ready
 
         package = Package(
             package_id=package_id, address=address, city=city, state=state, zip_code=zip_code,
-            deadline=deadline, weight=weight, note=row[7], status=status) # creates a package object
-
-        self.add_address_group(address, package_id) # adds the package id to the address dictionary
+            deadline=deadline, weight=weight, note=note, status=status) # creates a package object
 
         # Set parsed note attributes
         if grouped_packages is not None:
-            package.must_be_delivered_with = grouped_packages
+            package.must_be_delivered_with = list(grouped_packages)
 
         if available_time is not None:
             package.available_time = available_time
@@ -83,51 +99,26 @@ class PackageLoader:
     def parse_deadline(self, deadline_str:str) -> Optional[datetime]:
         """
         Parses the deadline from the csv file and returns a datetime object.
+        Deadlines are memoized, see NoteParser.
         """
-        # if the deadline is EOD, return None
-        if deadline_str.strip().upper() == 'EOD':
-            return None
-        
-        # if the deadline is not EOD, parse the deadline and return a datetime object
-        try:
-            return datetime.strptime(deadline_str.strip(), '%I:%M %p')
-        except ValueError:
-            raise ValueError('Invalid deadline string')
+        return NoteParser.parse_deadline(deadline_str)
 
     def parse_note(self, note_str:str):
         """
-        Parses the note from the csv file and returns a dictionary.
+        Parses the note from the csv file and returns (required truck, available time, grouped package ids, wrong address).
+        Notes are memoized, see NoteParser.
         """
-        note_str = note_str.lower() # converts the note to lowercase
-        required_truck = None
-        available_time = None
-        grouped_packages = None
-        wrong_address = False
-
-        # if the note contains the word "truck", parse the truck number and add it to the dictionary
-        if "truck" in note_str:
-            match = re.search(r'truck\s*(\d+)', note_str)
-            if match:
-                required_truck = int(match.group(1))
-
-        # if the note contains the word "delayed", parse the time and add it to the dictionary
-        if "delayed" in note_str:
-            match = re.search(r'\b\d{1,2}:\d{2}\s*(?:am|pm)\b', note_str)
-            if match:
-                time_obj = datetime.strptime(match.group(), '%I:%M %p')
-                available_time = time_obj
-
-        # if the note contains the word "must be delivered with", parse the package ids and add them to the dictionary
-        if "must be delivered with" in note_str:
-            match = re.findall(r'\d+', note_str)
-            if match:
-                grouped_packages = list(map(int, match))
+        return NoteParser.parse_note(note_str)
 
-        # if the note contains the word "wrong address", set the wrong address to true
-        if "wrong address" in note_str:
-            wrong_address = True
-
-        return required_truck, available_time, grouped_packages, wrong_address
+    def resolve_nodes(self) -> None:
+        """
+        Resolves the address of every package to its index within the distance map.
+        With an oracle set on the distance map, the missing addresses are estimated together in one pass.
+        """
+        if self.distance_map.oracle is not None:
+            self.distance_map.add_addresses([package.address_w_zip for package in self.package_hash_map])
+        for package in self.package_hash_map:
+            package.set_node(self.distance_map.get_index(package.address_w_zip))
 
     def get_map(self) -> PackageHashMap:
         """
@@ -137,75 +128,30 @@ class PackageLoader:
 
     def build_groups(self) -> None:
         """
-        Builds the groups of packages.
+        Builds the groups of packages from the co-delivery groups merged by the constraint graph.
         """
-        groups = []
-        for package in self.package_hash_map.packages_table:
-            if not isinstance(package, Package):
-                continue
-            # if the package is grouped, add the package id to the must be delivered with list
-            if package.must_be_delivered_with:
-                new_group = set([package.package_id] + package.must_be_delivered_with) # creates a new group with the package id and the package ids in the must be delivered with list
-
-                merged = []
-
-                for group in groups:
-                    # if the group does not have any packages in common with the new group, add the group to the merged list
-                    if not group.isdisjoint(new_group):
-                        new_group.update(group) # update the new group with the group
-                    # if the group has packages in common with the new group, update the new group with the group
-                    else:
-                        merged.append(group)
-                merged.append(new_group) # add the new group to the merged list
-                groups = merged
         # for each group, set the must be delivered with list to the group 
-        for group in groups:
+        for group in self.constraints.get_groups():
             # for each package in the group, set the must be delivered with list to the group
             for member_id in group:
                 package = self.package_hash_map[member_id]
                 package.must_be_delivered_with = group
 
-    def add_address_group(self, address, package_id):
-        for pair in self.address_groups:
-            if pair[0] == address:
-                pair[1].append(package_id)
-                return
-            # If address not found, add new
-        self.address_groups.append([address, [package_id]])
-
     def get_package_ids_for_address(self, address):
-        for pair in self.address_groups:
-            if pair[0] == address:
-                return pair[1]
-        return []
+        """
+        Returns the ids of the packages delivered to the address, looked up in the constraint graph.
+        """
+        return self.constraints.get_siblings(address)
 
     def build_shared_addresses(self):
         """
-        Builds the shared addresses of packages.
+        Builds the shared addresses of packages, once per address.
         """
-        visited = set() # initializes an empty set
-
-        # for each package
-        for package in self.package_hash_map.packages_table:
-
-            # if the package is not a package, continue
-            if not isinstance(package, Package):
-                continue
-
-            # if the package has already been visited, continue
-            if package.address in visited:
-                continue
-
-            # if the package has packages at the same address
-            package_ids = self.get_package_ids_for_address(package.address)
+        for package_ids in self.constraints.address_siblings.values():
+            # a package alone at its address has no siblings
             if len(package_ids) == 1:
-                visited.add(package.address)
-                package.set_packages_at_same_address(None)
+                self.package_hash_map[package_ids[0]].set_packages_at_same_address(None)
                 continue
 
-            if len(package_ids) > 1:
-                package.set_packages_at_same_address(package_ids)
-                for pid in package_ids:
-                    other_package = self.package_hash_map.search_package(pid)
-                    other_package.set_packages_at_same_address(package_ids)
-                visited.add(package.address)
\ No newline at end of file
+            for pid in package_ids:
+                self.package_hash_map[pid].set_packages_at_same_address(package_ids)
\ No newline at end of file
@@ -0,0 +1,102 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from wgups.dataloader.PackageLoader import PackageLoader, PackageRecord, row_to_record
+from wgups.datastore.DistanceMap import DistanceMap
+from wgups.datastore.PackageHashMap import PackageHashMap
+
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024 # the size of the byte ranges a large file is split into
+
+
+def split_file(file: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> list[tuple[str, int, int]]:
+    """
+    Splits a file into byte ranges of about chunk_bytes.
+    Each range owns the lines that start inside it, so the ranges do not need to be aligned to line boundaries.
+
+    :return: list of (file, start, end)
+    """
+    size = os.path.getsize(file)
+    if size == 0:
+        return []
+    chunk_bytes = max(chunk_bytes, 1)
+    return [(file, start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def parse_chunk(file: str, start: int, end: int) -> list[PackageRecord]:
+    """
+    Parses the csv rows that start within a byte range of the file into package records.
+    The header row is skipped by the range that starts at the beginning of the file.
+    Rows must not contain quoted line breaks, since a range may start in the middle of any line.
+    """
+    lines = []
+    with open(file, 'rb') as csvfile:
+        if start == 0:
+            csvfile.readline() # skips the header
+        else:
+            csvfile.seek(start - 1)
+            csvfile.readline() # moves to the first line that starts within the range
+        while csvfile.tell() < end:
+            line = csvfile.readline()
+            if not line:
+                break
+            lines.append(line.decode('utf-8'))
+
+    return [row_to_record(row) for row in csv.reader(lines, delimiter=',') if row]
+
+
+class ParallelPackageLoader(PackageLoader):
+    """
+    This class is used to load packages from several csv files, or from one large csv file, in parallel.
+
+    The files are split into byte ranges that are parsed into compact records by a pool of processes,
+    then the records are merged into one hash map in file order. Groups, shared addresses and nodes
+    are built the same as in PackageLoader.
+    """
+    def __init__(self, files: list[str] | str, package_hash_map: PackageHashMap, distance_map: Optional[DistanceMap] = None,
+                 workers: Optional[int] = None, chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+        """
+        Initializes the ParallelPackageLoader class.
+
+        :param files: the csv files to load
+        :param package_hash_map: the hash map the packages are added to
+        :param distance_map: the distance map used to resolve the nodes of the packages
+        :param workers: the number of processes, None uses every core
+        :param chunk_bytes: the size of the byte ranges the files are split into
+        """
+        self.files = [files] if isinstance(files, str) else list(files)
+        self.workers = workers
+        self.chunk_bytes = chunk_bytes
+        super().__init__(self.files[0] if self.files else "", package_hash_map, distance_map)
+
+    def load_from_file(self) -> Optional[PackageHashMap]:
+        """
+        Loads the packages from every file, parsing the chunks in parallel.
+
+        :raises ValueError: if a package id appears more than once, or is already in the hash map
+        """
+        chunks = [chunk for file in self.files for chunk in split_file(file, self.chunk_bytes)]
+        if len(chunks) <= 1 or self.workers == 1:
+            chunk_records = [parse_chunk(*chunk) for chunk in chunks] # not worth starting processes
+        else:
+            files, starts, ends = zip(*chunks)
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                chunk_records = list(pool.map(parse_chunk, files, starts, ends))
+
+        seen = set(self.package_hash_map.ids())
+        duplicates = []
+        records = []
+        for chunk in chunk_records:
+            for record in chunk:
+                if record[0] in seen:
+                    duplicates.append(record[0])
+                    continue
+                seen.add(record[0])
+                records.append(record)
+        if duplicates:
+            raise ValueError(f"Duplicate package ids: {sorted(set(duplicates))}")
+
+        packages = [self.record_to_package(record) for record in records]
+        self.package_hash_map.add_packages(packages, expected_count=len(packages)) # adds the packages to the hash map, sizing it once
+        return self.package_hash_map
@@ -0,0 +1,161 @@
+import csv
+import hashlib
+import re
+from collections.abc import Callable, Sequence
+from typing import Optional, Protocol
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+DEFAULT_ROAD_FACTOR = 1.3 # road distance per mile of straight-line distance, used when the map cannot be calibrated
+ADDRESS_W_ZIP_PATTERN = re.compile(r'^(.*)\((\d+)\)$') # "410 S State St(84111)", the format of the distance map addresses
+
+
+class BatchGeocoder(Protocol):
+    """
+    Geocodes a list of addresses at once, such as the GeocodingPipeline of the data loaders,
+    returning (None, None) for the addresses it cannot find.
+    """
+    def geocode_all(self, addresses: list[str]) -> list[tuple[Optional[float], Optional[float]]]:
+        ...
+
+
+def normalize_address(address: str) -> str:
+    """
+    Returns the key an address is looked up under: lowercase, without periods, with single spaces.
+    """
+    address = address.lower().replace('.', '')
+    address = re.sub(r'\s*,\s*', ', ', address)
+    return re.sub(r'\s+', ' ', address).strip()
+
+
+def haversine_miles(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """
+    Returns the great-circle distances in miles between two sets of coordinates, broadcasting like any numpy operation.
+    Pairs with a NaN coordinate give NaN.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class CoordinateOracle:
+    """
+    This class is used to estimate the distances of addresses that are not in the distance map,
+    from the latitude and longitude of the addresses.
+
+    A straight-line distance is scaled by a road factor, calibrated against the pairs of the distance map whose
+    coordinates are known. An address is reached through its nearest geocoded address of the map (the anchors),
+    so the addresses of the map without coordinates, such as the HUB, are still estimated, and the estimates
+    follow the road distances already in the map.
+    """
+    def __init__(self, coordinates: dict[str, tuple[float, float]], road_factor: Optional[float] = None,
+                 geocoder: Optional[BatchGeocoder] = None):
+        """
+        Initializes the CoordinateOracle class.
+
+        :param coordinates: maps addresses in the format of the distance map to (latitude, longitude)
+        :param road_factor: road distance per mile of straight-line distance, None calibrates it against the distance map
+        :param geocoder: geocodes the addresses without coordinates, for example a GeocodingPipeline,
+            None leaves them unknown
+        """
+        self.coordinates = {normalize_address(address): latlon for address, latlon in coordinates.items()}
+        self.road_factor = road_factor
+        self.geocoder = geocoder
+
+    @classmethod
+    def from_csv(cls, file: str, road_factor: Optional[float] = None, geocoder: Optional[BatchGeocoder] = None) -> 'CoordinateOracle':
+        """
+        Builds the oracle from the csv file written by Loader.py, with Address, Zip, Latitude and Longitude columns.
+        """
+        coordinates = {}
+        with open(file, 'r') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if row.get("Latitude") and row.get("Longitude"):
+                    address_w_zip = f"{row['Address'].strip()}({row['Zip'].strip()})" # the same format as Package.address_w_zip
+                    coordinates[address_w_zip] = (float(row["Latitude"]), float(row["Longitude"]))
+        return cls(coordinates, road_factor, geocoder)
+
+    def get_fingerprint(self) -> str:
+        """
+        Returns a hash of the coordinates, the configured road factor and the geocoder, which identifies the estimates
+        the oracle gives, so that a cached distance map is only reused with the same oracle.
+        """
+        digest = hashlib.sha256()
+        for address, (lat, lon) in sorted(self.coordinates.items()):
+            digest.update(f"{address}|{lat!r}|{lon!r}\n".encode("utf-8"))
+        backend = getattr(self.geocoder, 'geocoder', self.geocoder) # a pipeline is identified by the backend it wraps
+        digest.update(f"{self.road_factor!r}|{type(self.geocoder).__name__}|{type(backend).__name__}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_coordinates(self, addresses: Sequence[str]) -> np.ndarray:
+        """
+        Returns the (latitude, longitude) of every address as an array of shape (len(addresses), 2), NaN where unknown.
+        The addresses without coordinates are geocoded once if the oracle has a geocoder.
+        """
+        keys = [normalize_address(address) for address in addresses]
+        if self.geocoder is not None:
+            missing = {key: address for key, address in zip(keys, addresses) if key not in self.coordinates}
+            if missing:
+                queries = [self.to_query(address) for address in missing.values()]
+                for key, (lat, lon) in zip(missing, self.geocoder.geocode_all(queries)):
+                    if lat is not None:
+                        self.coordinates[key] = (lat, lon)
+
+        nan = (np.nan, np.nan)
+        return np.array([self.coordinates.get(key, nan) for key in keys], dtype=np.float64).reshape(len(keys), 2)
+
+    @staticmethod
+    def to_query(address: str) -> str:
+        """
+        Converts an address of the distance map such as "410 S State St(84111)" to "410 S State St, 84111" for a geocoder.
+        """
+        match = ADDRESS_W_ZIP_PATTERN.match(address)
+        return f"{match.group(1)}, {match.group(2)}" if match else address
+
+    def calibrate(self, addresses: Sequence[str], matrix: np.ndarray) -> float:
+        """
+        Sets the road factor to the median ratio of road distance to straight-line distance
+        over the pairs of the distance map whose coordinates are known, and returns it.
+        """
+        coords = self.get_coordinates(addresses)
+        straight = haversine_miles(coords[:, None, 0], coords[:, None, 1], coords[None, :, 0], coords[None, :, 1])
+        valid = np.triu(~np.isnan(straight) & (straight > 0) & (matrix > 0), k=1)
+        self.road_factor = float(np.median(matrix[valid] / straight[valid])) if valid.any() else DEFAULT_ROAD_FACTOR
+        return self.road_factor
+
+    def estimate_rows(self, new_addresses: Sequence[str], addresses: Sequence[str],
+                      get_row: Callable[[int], np.ndarray]) -> np.ndarray:
+        """
+        Estimates the distances from each new address to every address of the distance map and to every new address.
+
+        The distance to an address of the map is the shortest estimated distance to an anchor plus the road distance
+        from the anchor, relaxed one anchor at a time so that only one row of the map is read at once.
+        A new address without coordinates is given the largest distance of the map to every address,
+        so it can still be routed, last.
+
+        :param new_addresses: the addresses to estimate, none of which are in the map
+        :param addresses: the addresses of the distance map
+        :param get_row: returns the distances from an address of the map to every address of the map
+        :return: np.ndarray of shape (len(new_addresses), len(addresses) + len(new_addresses))
+        """
+        size, count = len(addresses), len(new_addresses)
+        if self.road_factor is None:
+            self.calibrate(addresses, np.array([get_row(i) for i in range(size)]).reshape(size, size))
+        known = self.get_coordinates(addresses)
+        new = self.get_coordinates(new_addresses)
+
+        rows = np.full((count, size + count), np.inf)
+        anchors = np.flatnonzero(~np.isnan(known[:, 0]))
+        to_anchors = self.road_factor * haversine_miles(new[:, None, 0], new[:, None, 1],
+                                                        known[None, anchors, 0], known[None, anchors, 1]) # NaN without coordinates
+        estimated = rows[:, :size]
+        for position, anchor in enumerate(anchors):
+            np.fmin(estimated, to_anchors[:, position, None] + get_row(anchor), out=estimated) # fmin skips the NaN
+        rows[:, size:] = self.road_factor * haversine_miles(new[:, None, 0], new[:, None, 1], new[None, :, 0], new[None, :, 1])
+
+        unknown = ~np.isfinite(rows)
+        if unknown.any():
+            rows[unknown] = max((float(get_row(node).max()) for node in range(size)), default=0.0) # the largest distance of the map
+        rows[np.arange(count), size + np.arange(count)] = 0.0
+        return rows
@@ -1,45 +1,414 @@
+import hashlib
+from collections.abc import Sequence
+
+import numpy as np
+
+from wgups.datastore.CoordinateOracle import CoordinateOracle
+from wgups.datastore.DistanceMatrixFile import (expand_triangle, pack_triangle, read_matrix_file, triangle_index,
+                                                 triangle_size, write_matrix_file)
+from wgups.datastore.TravelTimeMatrix import TravelTimeMatrix
+
+BINARY_EXTENSION = ".wgdm" # extension of the binary distance matrix format, see DistanceMatrixFile
+CLOSURE_SUFFIX = ".closure.npz" # suffix of the cached metric closure, stored beside the source file
+DEFAULT_NEIGHBOR_K = 16 # nearest addresses kept per address, one truckload; walks past them fall back to a scan
+
+
 class DistanceMap:
     """
     This class is used to store the distance map of the addresses.
+
+    The matrix is symmetric, so only its lower triangle (diagonal included) is kept, packed row by row in one
+    contiguous array, and every lookup reads from it: a single distance through its index in the triangle,
+    and rows or blocks of the matrix through one vectorized gather. Each address is mapped to its row in the matrix
+    through a dictionary.
+
+    With metric_closure enabled, every distance is replaced by the length of the shortest path between
+    the two addresses, so the matrix satisfies the triangle inequality that the insertion logic in Routing relies on.
+
+    With a CoordinateOracle set, the addresses that are not in the matrix can be added through add_addresses,
+    with distances estimated from their coordinates. Their rows are kept in a separate extension rather than
+    appended to the loaded triangle, so that a memory-mapped triangle stays mapped. Looking up an address never
+    changes the map.
     """
-    def __init__(self, file:str):
+    def __init__(self, file:str, metric_closure: bool = False, load: bool = True):
         self.addresses = [] # list of addresses
-        self.matrix = [] # matrix of distances
+        self.address_index: dict[str, int] = {} # maps each address to its index within the matrix
+        self.triangle = np.zeros(0, dtype=np.float64) # lower triangle of the distance matrix, packed row by row
+        self.base_cells = 0 # the number of cells in self.triangle, the cells after them are in self.extension
+        self.extension = np.zeros(0, dtype=np.float64) # the packed rows of the addresses added by add_addresses
+        self.travel_times: dict[float, TravelTimeMatrix] = {} # travel times between every pair of addresses, keyed by speed
+        self.neighbor_index: list[list[int]] | None = None # for each address, its nearest addresses sorted from nearest to farthest
+        self.neighbor_k: int | None = DEFAULT_NEIGHBOR_K # the number of neighbors kept per address, None keeps every address
+        self.shortened_pairs: list[tuple[int, int, float]] = [] # (i, j, original distance) of the pairs shortened by the metric closure
+        self.oracle: CoordinateOracle | None = None # estimates the distances of unknown addresses, see set_oracle
+        self.estimated: set[int] = set() # indices of the addresses whose distances were estimated by the oracle
         self.file = file # file containing the distance map
+        self.metric_closure = metric_closure # whether the distances are replaced by their shortest-path closure
+        if not load:
+            return # the triangle is set by the caller, see from_triangle
         self.load_from_file() # loads the distance map from the file
+        if self.metric_closure:
+            self.apply_metric_closure()
+
+    @classmethod
+    def from_triangle(cls, file: str, addresses: list[str], triangle: np.ndarray, metric_closure: bool = False,
+                      shortened_pairs: Sequence[tuple[int, int, float]] = ()) -> 'DistanceMap':
+        """
+        Builds a distance map from addresses and a packed triangle that were already loaded, without reading the file.
+
+        :param file: the file the distances originally came from
+        :param addresses: the addresses, in the same order as the rows of the matrix
+        :param triangle: lower triangle of the distance matrix, packed row by row
+        :param metric_closure: whether the matrix is a shortest-path closure
+        :param shortened_pairs: the pairs shortened by the metric closure
+        """
+        distance_map = cls(file, metric_closure, load=False)
+        distance_map.addresses = list(addresses)
+        distance_map.shortened_pairs = list(shortened_pairs)
+        distance_map.set_triangle(triangle)
+        return distance_map
 
 
     def load_from_file(self):
         """
-        Loads the distance map from the file.
+        Loads the distance map from the file, either a csv file or a binary distance matrix file.
         """
+        if self.file.endswith(BINARY_EXTENSION):
+            self.load_from_binary()
+            return
+
         import csv
         with open(self.file, 'r') as csvfile:
             reader = csv.reader(csvfile, delimiter=',')
             self.addresses = next(reader)[1:]
 
+            size = len(self.addresses)
+            triangle = np.zeros(triangle_size(size), dtype=np.float64) # the file lists the lower triangle, row by row
             for i, row in enumerate(reader):
-                distances = [float(cell) if cell else 0.0 for cell in row[1:]] # converts the distances to floats
-                self.matrix.append(distances) # adds the distances to the matrix
+                if i >= size or not row or not row[0]: # skips the trailing rows that do not list an address
+                    break
+                distances = [float(cell) if cell else 0.0 for cell in row[1:i + 1]] # converts the distances up to the diagonal to floats
+                start = triangle_size(i) # row i of the triangle starts after the cells of rows 0 to i - 1
+                triangle[start:start + len(distances)] = distances # adds the distances to the triangle
+
+        self.set_triangle(triangle)
+
+    def load_from_binary(self) -> None:
+        """
+        Loads the distance map from a binary distance matrix file by memory-mapping its triangle.
+        The mapped triangle is kept as is and serves every lookup, so the file is never copied into memory
+        and processes reading the same file share its pages.
+        """
+        self.addresses, triangle = read_matrix_file(self.file)
+        self.set_triangle(triangle)
+
+    def save_binary(self, file: str, dtype=np.float64) -> None:
+        """
+        Saves the distance map to a binary distance matrix file.
+
+        :param file: path of the binary file to write
+        :param dtype: np.float32 or np.float64, the precision the distances are stored with
+        """
+        write_matrix_file(file, self.addresses, self.get_triangle(), dtype)
+
+    @staticmethod
+    def convert_csv_to_binary(csv_file: str, binary_file: str, dtype=np.float64) -> None:
+        """
+        Converts a distance csv file to the binary distance matrix format.
+
+        :param csv_file: path of the csv file to read
+        :param binary_file: path of the binary file to write
+        :param dtype: np.float32 or np.float64, the precision the distances are stored with
+        """
+        DistanceMap(csv_file).save_binary(binary_file, dtype)
+
+    @staticmethod
+    def compute_metric_closure(matrix: np.ndarray) -> np.ndarray:
+        """
+        Returns the all-pairs shortest-path closure of a distance matrix using a vectorized Floyd-Warshall,
+        relaxing every pair through one intermediate address per step.
+
+        :param matrix: square symmetric matrix of distances
+        :return: np.ndarray
+        """
+        closure = np.array(matrix, dtype=np.float64)
+        for k in range(closure.shape[0]):
+            np.minimum(closure, closure[:, k, np.newaxis] + closure[np.newaxis, k, :], out=closure)
+        return np.where(np.isclose(closure, matrix), matrix, closure) # keeps the original distances that only differ by rounding error
+
+    def apply_metric_closure(self) -> None:
+        """
+        Replaces the distances with their shortest-path closure and records the pairs that were shortened.
+        The closure is cached beside the source file and reused as long as the source file is unchanged.
+        """
+        cache_file = self.file + CLOSURE_SUFFIX
+        with open(self.file, 'rb') as source:
+            source_hash = hashlib.sha256(source.read()).hexdigest() # the cache is only valid for this exact source
+
+        try:
+            with np.load(cache_file) as cached:
+                if str(cached['source_hash']) != source_hash:
+                    raise ValueError("stale metric closure cache")
+                closure = cached['triangle']
+                rows, cols = cached['rows'], cached['cols']
+        except (OSError, KeyError, ValueError):
+            matrix = self.to_dense()
+            closure_matrix = self.compute_metric_closure(matrix)
+            rows, cols = np.nonzero(np.triu(closure_matrix < matrix)) # each shortened pair, once
+            closure = pack_triangle(closure_matrix)
+            try:
+                np.savez(cache_file, source_hash=source_hash, triangle=closure, rows=rows, cols=cols)
+            except OSError:
+                pass # the closure still applies when the cache cannot be written next to the source
+
+        self.shortened_pairs = [(i, j, self.get_distance_by_index(i, j)) for i, j in zip(rows.tolist(), cols.tolist())]
+        self.set_triangle(closure)
+
+    def get_shortened_pairs(self) -> list[tuple[str, str, float, float]]:
+        """
+        Returns the pairs of addresses whose distance was shortened by the metric closure.
+
+        :return: list of (address 1, address 2, original distance, shortest-path distance)
+        """
+        return [(self.addresses[i], self.addresses[j], original, self.get_distance_by_index(i, j))
+                for i, j, original in self.shortened_pairs]
+
+    def set_triangle(self, triangle: np.ndarray) -> None:
+        """
+        Sets the packed lower triangle of the distance matrix and rebuilds the lookup structures derived from it.
+
+        :param triangle: lower triangle of the distance matrix, packed row by row, ordered the same as self.addresses,
+            kept without a copy so that a memory-mapped triangle stays mapped
+        """
+        self.triangle = triangle
+        self.base_cells = len(triangle)
+        self.extension = np.zeros(0, dtype=np.float64)
+        self.address_index = {address: i for i, address in enumerate(self.addresses)}
+        self.neighbor_index = None
+        for travel_times in self.travel_times.values():
+            travel_times.rebuild(self.triangle) # the travel times are derived from the distances
+
+    def get_triangle(self) -> np.ndarray:
+        """
+        Returns the packed lower triangle of every address, the added ones included,
+        for saving or caching the whole map. The loaded triangle is only copied if addresses were added.
+        """
+        if not len(self.extension):
+            return self.triangle
+        return np.concatenate([self.triangle, self.extension])
+    def set_oracle(self, oracle: CoordinateOracle) -> None:
+        """
+        Sets the oracle used to estimate the distances of addresses that are not in the matrix,
+        calibrating its road factor against this matrix if it has none.
+        """
+        self.oracle = oracle
+        if oracle.road_factor is None:
+            oracle.calibrate(self.addresses, self.to_dense())
+
+    def add_addresses(self, addresses: Sequence[str]) -> list[int]:
+        """
+        Adds the addresses that are not in the matrix, estimating all of their rows with the oracle in one pass,
+        and returns the index of every address.
+
+        :raises KeyError: if an address is missing and no oracle is set
+        """
+        new_addresses = list(dict.fromkeys(address for address in addresses if address not in self.address_index))
+        if new_addresses:
+            if self.oracle is None:
+                raise KeyError(new_addresses[0])
+            self.extend_matrix(new_addresses, self.oracle.estimate_rows(new_addresses, self.addresses, self.get_row))
+        return [self.address_index[address] for address in addresses]
+
+    def extend_matrix(self, new_addresses: list[str], new_rows: np.ndarray) -> None:
+        """
+        Appends addresses to the matrix. Their rows go to the extension, leaving the loaded triangle untouched.
+
+        :param new_addresses: the addresses to append
+        :param new_rows: the distances from each new address to every address, the new ones included,
+            of shape (len(new_addresses), len(self.addresses) + len(new_addresses))
+        """
+        size = len(self.addresses)
+        # row size + k of the triangle holds the distances from the new address k up to itself
+        new_cells = np.concatenate([np.asarray(row[:size + k + 1], dtype=np.float64) for k, row in enumerate(new_rows)])
+        self.extension = np.concatenate([self.extension, new_cells])
+
+        for i, address in enumerate(new_addresses, start=size):
+            self.addresses.append(address)
+            self.address_index[address] = i
+            self.estimated.add(i)
+        for travel_times in self.travel_times.values():
+            travel_times.extend(new_cells)
+        if self.neighbor_index is not None:
+            self.merge_neighbors(size)
 
     def get_distance(self, addr1: str, addr2: str):
         """
         Returns the distance between two addresses.
+
+        :raises KeyError: if an address is not in the matrix, see add_addresses
         """
         i = self.get_index(addr1) # gets the index of the first address
         j = self.get_index(addr2) # gets the index of the second address
-        return self.matrix[max(i, j)][min(i, j)] # returns the distance between the two addresses
+        if i is None or j is None:
+            raise KeyError(addr1 if i is None else addr2)
+        return self.get_distance_by_index(i, j) # returns the distance between the two addresses
+
+    def get_distance_by_index(self, i: int, j: int) -> float:
+        """
+        Returns the distance between two addresses using their indices within the matrix.
+
+        :param i: index of the first address
+        :param j: index of the second address
+        :return: float
+        """
+        if i < j:
+            i, j = j, i # the cell above the diagonal is read from its mirror in the lower triangle
+        cell = i * (i + 1) // 2 + j
+        if cell < self.base_cells:
+            return float(self.triangle[cell])
+        return float(self.extension[cell - self.base_cells]) # a row of an added address
+
+    def get_cells(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Returns the distances stored in the given cells of the packed triangle, reading the cells past the loaded
+        triangle from the extension, in one vectorized gather from each.
+        """
+        if not len(self.extension):
+            return self.triangle[cells].astype(np.float64, copy=False) # float32 files are widened
+        in_base = cells < self.base_cells
+        distances = np.empty(np.shape(cells), dtype=np.float64)
+        distances[in_base] = self.triangle[cells[in_base]]
+        distances[~in_base] = self.extension[cells[~in_base] - self.base_cells]
+        return distances
+
+    def get_distances(self, source: int, destinations: Sequence[int] | np.ndarray) -> np.ndarray:
+        """
+        Returns the distances from one address to many addresses in a single vectorized lookup.
+
+        :param source: index of the source address
+        :param destinations: indices of the destination addresses
+        :return: np.ndarray of distances, in the same order as destinations
+        """
+        return self.get_cells(triangle_index(source, destinations))
+
+    def get_row(self, source: int) -> np.ndarray:
+        """
+        Returns the distances from one address to every address, in the order of the matrix.
+        """
+        return self.get_distances(source, np.arange(len(self.addresses)))
+
+    def get_submatrix(self, nodes: Sequence[int]) -> np.ndarray:
+        """
+        Returns the square matrix of the distances between the given addresses, in the order given.
+        """
+        nodes = np.asarray(nodes, dtype=np.intp)
+        return self.get_cells(triangle_index(nodes[:, np.newaxis], nodes[np.newaxis, :]))
+
+    def to_dense(self) -> np.ndarray:
+        """
+        Returns a new full symmetric matrix of the distances, for the computations that work on the whole matrix.
+        """
+        return expand_triangle(self.get_triangle(), len(self.addresses))
+
+    def argmin_distance(self, source: int, destinations: Sequence[int] | np.ndarray, mask: np.ndarray | None = None) -> int | None:
+        """
+        Returns the position within destinations of the address nearest to the source,
+        skipping the destinations whose entry in mask is True.
+        Ties are broken in favor of the earliest position, the same as min().
+
+        :param source: index of the source address
+        :param destinations: indices of the destination addresses
+        :param mask: boolean array the same length as destinations, True for the destinations to skip
+        :return: int position within destinations, or None if every destination is skipped
+        """
+        if len(destinations) == 0:
+            return None
+        distances = self.get_distances(source, destinations)
+        if mask is not None:
+            if mask.all():
+                return None
+            distances = np.where(mask, np.inf, distances) # masked destinations can never be the nearest
+        return int(np.argmin(distances))
+
+    def build_neighbor_index(self, k: int | None = DEFAULT_NEIGHBOR_K) -> None:
+        """
+        Builds, for each address, the list of its k nearest addresses sorted from nearest to farthest.
+        The address itself comes first since it is at distance 0, and ties keep the order of the matrix.
+
+        :param k: the number of nearest addresses to keep per address, None keeps every address
+        """
+        self.neighbor_k = k
+        self.neighbor_index = [self.find_nearest(node) for node in range(len(self.addresses))]
+
+    def find_nearest(self, node: int) -> list[int]:
+        """
+        Returns the neighbor_k nearest addresses of an address, sorted from nearest to farthest, ties in matrix order.
+        Only the candidates up to the k-th smallest distance are sorted, rather than the whole row.
+        """
+        row = self.get_row(node)
+        k = self.neighbor_k
+        if k is None or k >= len(row):
+            return np.argsort(row, kind='stable').tolist()
+        kth = row[np.argpartition(row, k - 1)[k - 1]] # the k-th smallest distance
+        candidates = np.flatnonzero(row <= kth) # every tie with the k-th distance, in matrix order
+        return candidates[np.argsort(row[candidates], kind='stable')][:k].tolist()
+
+    def merge_neighbors(self, first_new: int) -> None:
+        """
+        Merges the addresses appended from first_new on into the neighbor lists of the other addresses,
+        and builds the lists of the appended addresses, so adding addresses does not sort every row again.
+        The k nearest of the merged candidates are the k nearest of the whole row, since the dropped addresses
+        were already farther than the k kept ones.
+        """
+        new_nodes = list(range(first_new, len(self.addresses)))
+        for node, neighbors in enumerate(self.neighbor_index):
+            candidates = neighbors + new_nodes
+            order = np.lexsort((candidates, self.get_distances(node, candidates)))[:self.neighbor_k] # by distance, then matrix order
+            self.neighbor_index[node] = [candidates[i] for i in order]
+        self.neighbor_index.extend(self.find_nearest(node) for node in new_nodes)
+
+    def get_neighbors(self, node: int) -> list[int]:
+        """
+        Returns the addresses sorted from nearest to farthest from the given address.
+        Only the neighbor_k nearest addresses are listed. The neighbor index is built on first use
+        if it has not been built already.
+
+        :param node: index of the address
+        :return: list of address indices
+        """
+        if self.neighbor_index is None:
+            self.build_neighbor_index(self.neighbor_k)
+        return self.neighbor_index[node]
+
+    def get_travel_times(self, speed: float) -> TravelTimeMatrix:
+        """
+        Returns the travel times between every pair of addresses at the given speed.
+        The matrix is derived from the distances once per speed and cached, and it is kept up to date in place
+        when addresses are added, so the matrix handed out stays valid.
+
+        :param speed: the average speed in miles per hour
+        :return: TravelTimeMatrix
+        """
+        if speed not in self.travel_times:
+            self.travel_times[speed] = TravelTimeMatrix(speed)
+            self.travel_times[speed].extend(self.triangle)
+            self.travel_times[speed].extend(self.extension)
+        return self.travel_times[speed]
 
     def get_index(self, addr: str) -> int | None:
         """
-        Returns the index of the address within the matrix.
+        Returns the index of the address within the matrix, or None if it is not in the matrix.
+        The lookup never changes the map, the missing addresses are added through add_addresses.
         :param addr:
         :return: int
         """
-        for i, row in enumerate(self.addresses):
-            if row == addr:
-                return i
-        return None
+        return self.address_index.get(addr)
+
+    def __len__(self):
+        """
+        Returns the number of addresses in the distance map.
+        """
+        return len(self.addresses)
 
     def __str__(self):
         """
@@ -56,9 +425,3 @@ class DistanceMap:
 
         return (f"DistanceMap with {len(self.addresses)} addresses\n"
                 f"Sample distances:\n" + "\n".join(sample))
-
-
-
-
-
-
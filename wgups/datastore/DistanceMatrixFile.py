@@ -0,0 +1,110 @@
+"""
+Binary on-disk format for the distance matrix.
+
+Layout (little endian):
+    header:         magic (4 bytes) | version (uint16) | item size (uint16) | address count (uint32) | address table size (uint32)
+    address table:  the addresses encoded as utf-8 and separated by newlines
+    padding:        zero bytes up to the next multiple of 8
+    triangle:       the lower triangle of the matrix (diagonal included), row by row, as float32 or float64
+
+The triangle is memory-mapped on load, so the file is never parsed and several processes
+reading the same file share one copy of it through the page cache.
+"""
+
+import struct
+
+import numpy as np
+
+MAGIC = b"WGDM"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+DTYPES = {4: np.float32, 8: np.float64} # maps the item size stored in the header to the dtype of the triangle
+
+
+def triangle_size(count: int) -> int:
+    """
+    Returns the number of cells in the lower triangle (diagonal included) of a count x count matrix.
+    """
+    return count * (count + 1) // 2
+
+
+def triangle_index(rows, cols) -> np.ndarray:
+    """
+    Returns the positions within the packed lower triangle of the cells at rows and cols, broadcasting like any
+    numpy operation. The matrix is symmetric, so a cell above the diagonal is read from its mirror below it.
+    """
+    rows, cols = np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)
+    high, low = np.maximum(rows, cols), np.minimum(rows, cols)
+    return high * (high + 1) // 2 + low
+
+
+def pack_triangle(matrix: np.ndarray, dtype=np.float64) -> np.ndarray:
+    """
+    Packs the lower triangle (diagonal included) of a square matrix row by row.
+    """
+    rows, cols = np.tril_indices(len(matrix))
+    return np.asarray(matrix, dtype=dtype)[rows, cols]
+
+
+def write_matrix_file(file: str, addresses: list[str], triangle: np.ndarray, dtype=np.float64) -> None:
+    """
+    Writes the addresses and the lower triangle of a symmetric distance matrix to a binary file.
+
+    :param file: path of the binary file to write
+    :param addresses: the addresses, in the same order as the rows of the matrix
+    :param triangle: lower triangle of the matrix (diagonal included), packed row by row, see pack_triangle
+    :param dtype: np.float32 or np.float64, the precision the triangle is stored with
+    """
+    dtype = np.dtype(dtype)
+    if dtype.itemsize not in DTYPES or dtype.kind != 'f':
+        raise ValueError(f"Unsupported dtype for distance matrix file: {dtype}")
+
+    count = len(addresses)
+    address_table = "\n".join(addresses).encode("utf-8")
+    header = HEADER.pack(MAGIC, VERSION, dtype.itemsize, count, len(address_table))
+    padding = b"\0" * (-(len(header) + len(address_table)) % 8) # aligns the triangle to 8 bytes
+
+    if len(triangle) != triangle_size(count):
+        raise ValueError(f"Expected {triangle_size(count)} distances for {count} addresses, got {len(triangle)}")
+    triangle = np.asarray(triangle, dtype=dtype)
+
+    with open(file, "wb") as binfile:
+        binfile.write(header)
+        binfile.write(address_table)
+        binfile.write(padding)
+        binfile.write(triangle.tobytes())
+
+
+def read_matrix_file(file: str) -> tuple[list[str], np.memmap]:
+    """
+    Reads the address table of a binary distance matrix file and memory-maps its triangle.
+
+    :param file: path of the binary file to read
+    :return: the addresses and the read-only memory-mapped lower triangle
+    """
+    with open(file, "rb") as binfile:
+        magic, version, item_size, count, table_size = HEADER.unpack(binfile.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{file} is not a distance matrix file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported distance matrix file version: {version}")
+        if item_size not in DTYPES:
+            raise ValueError(f"Unsupported item size in distance matrix file: {item_size}")
+        address_table = binfile.read(table_size).decode("utf-8")
+
+    addresses = address_table.split("\n") if count else []
+    offset = HEADER.size + table_size
+    offset += -offset % 8 # skips the padding in front of the triangle
+    triangle = np.memmap(file, dtype=DTYPES[item_size], mode="r", offset=offset, shape=(triangle_size(count),))
+    return addresses, triangle
+
+
+def expand_triangle(triangle: np.ndarray, count: int) -> np.ndarray:
+    """
+    Expands a packed lower triangle into the full symmetric count x count matrix.
+    """
+    matrix = np.zeros((count, count), dtype=np.float64)
+    rows, cols = np.tril_indices(count)
+    matrix[rows, cols] = triangle
+    matrix[cols, rows] = triangle
+    return matrix
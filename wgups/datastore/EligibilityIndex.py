@@ -0,0 +1,111 @@
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Optional, Union
+
+from wgups.Package import Package, PackageStatus
+from wgups.SimulationClock import SimulationClock
+from wgups.dataloader.ConstraintGraph import ConstraintGraph
+from wgups.datastore.PackageHashMap import PackageHashMap
+from wgups.datastore.PackageSnapshot import PackageSnapshot
+
+DELAYED = 'delayed' # the package has not arrived at the hub yet
+WRONG_ADDRESS = 'wrong address' # the address of the package has not been corrected yet
+
+
+class EligibilityIndex:
+    """
+    This class is used to keep the set of packages that can be loaded onto a truck, so that building a priority queue
+    only looks at the packages that are waiting at the hub, however many packages were dispatched earlier in the day.
+
+    A package waits on the reasons it cannot be loaded yet, and becomes eligible once every reason is released:
+    delayed packages are released by a clock event at their available time, and packages with a wrong address
+    by the address fix. Dispatched packages leave the index.
+
+    The index starts from the packages still at the hub, looked up through the status index of the hash map,
+    so an index built later in the day, or over a snapshot, leaves out the packages already loaded or delivered.
+    """
+    def __init__(self, packages: Union[PackageHashMap, PackageSnapshot], constraints: Optional[ConstraintGraph] = None):
+        """
+        Initializes the EligibilityIndex class.
+
+        :param packages: the hash map of the packages, or a snapshot of it
+        :param constraints: the truck pins of the packages, including the pins a group inherits from a member,
+            None pins each package only through its own note
+        """
+        self.eligible: dict[int, Optional[int]] = {} # package id -> the truck it is pinned to, in id order
+        self.waiting: dict[int, set[str]] = {} # package id -> the reasons it is not eligible yet
+        self.order: dict[int, int] = {} # package id -> its position in id order, so released packages keep that order
+        self.pinned: dict[int, Optional[int]] = {} # package id -> the truck it is pinned to
+        at_hub = packages.get_packages_by_status(PackageStatus.NOT_READY, PackageStatus.AT_HUB)
+        for position, package in enumerate(sorted(at_hub, key=lambda package: package.package_id)):
+            self.order[package.package_id] = position
+            self.pinned[package.package_id] = (constraints.get_required_truck(package.package_id) if constraints
+                                               else package.required_truck)
+            reasons = set()
+            if package.available_time is not None:
+                reasons.add(DELAYED)
+            if package.wrong_address:
+                reasons.add(WRONG_ADDRESS)
+            if reasons:
+                self.waiting[package.package_id] = reasons
+            else:
+                self.eligible[package.package_id] = self.pinned[package.package_id]
+
+    def schedule_releases(self, clock: SimulationClock, packages: Iterable[Package]) -> None:
+        """
+        Schedules one clock event per distinct available time, releasing the delayed packages that arrive then.
+        Packages that are already available at the current time of the clock are released right away.
+        """
+        arrivals: dict[datetime, list[int]] = {}
+        for package in packages:
+            if package.package_id in self.waiting and DELAYED in self.waiting[package.package_id]:
+                arrivals.setdefault(package.available_time, []).append(package.package_id)
+
+        for available_time, package_ids in sorted(arrivals.items()):
+            if available_time <= clock.now():
+                self.release(package_ids, DELAYED)
+            else:
+                clock.schedule_event(available_time, self.release_delayed, tuple(package_ids))
+
+    def release_delayed(self, package_ids: tuple[int, ...]) -> None:
+        """
+        Clock event that releases packages which arrived at the hub.
+        """
+        self.release(package_ids, DELAYED)
+
+    def release(self, package_ids: Iterable[int], reason: str) -> None:
+        """
+        Releases one reason the packages were waiting on, making the packages with no reason left eligible.
+        """
+        released = False
+        for package_id in package_ids:
+            reasons = self.waiting.get(package_id)
+            if reasons is None:
+                continue
+            reasons.discard(reason)
+            if not reasons:
+                del self.waiting[package_id]
+                self.eligible[package_id] = self.pinned[package_id]
+                released = True
+        if released:
+            self.eligible = dict(sorted(self.eligible.items(), key=lambda item: self.order[item[0]])) # keeps id order
+
+    def dispatch(self, package_ids: Iterable[int]) -> None:
+        """
+        Removes packages that were loaded onto a truck from the index.
+        """
+        for package_id in package_ids:
+            self.eligible.pop(package_id, None)
+            self.waiting.pop(package_id, None)
+
+    def get_eligible(self, truck_id: int) -> list[int]:
+        """
+        Returns the ids of the eligible packages that can go on the truck, in id order.
+        """
+        return [package_id for package_id, truck in self.eligible.items() if truck is None or truck == truck_id]
+
+    def is_eligible(self, package_id: int) -> bool:
+        return package_id in self.eligible
+
+    def __len__(self):
+        return len(self.eligible)
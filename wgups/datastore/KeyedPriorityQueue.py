@@ -0,0 +1,88 @@
+import heapq
+import itertools
+from collections.abc import Hashable
+from typing import Any, Optional
+
+REMOVED = object() # marks a heap entry whose key was updated or removed
+
+
+class KeyedPriorityQueue:
+    """
+    This class is used as a min-heap of items addressed by key, where the priority of an entry can be changed
+    or the entry removed without rebuilding the heap.
+
+    Changed and removed entries are marked and skipped when they reach the top of the heap,
+    the same as the priority queue recipe in the heapq documentation. Entries with the same priority
+    come out in the order they were pushed.
+    """
+    def __init__(self):
+        self.heap: list[list[Any]] = [] # [priority, counter, key, item] entries
+        self.entries: dict[Hashable, list[Any]] = {} # key -> its live entry in the heap
+        self.counter = itertools.count() # breaks ties between equal priorities in push order
+
+    def push(self, key: Hashable, item: Any, priority: tuple) -> None:
+        """
+        Adds an item, or replaces the priority and item of the key if it is already in the queue.
+        """
+        if key in self.entries:
+            self.remove(key)
+        entry = [priority, next(self.counter), key, item]
+        self.entries[key] = entry
+        heapq.heappush(self.heap, entry)
+
+    def decrease_key(self, key: Hashable, priority: tuple) -> bool:
+        """
+        Lowers the priority of the key, and returns whether it changed.
+
+        :raises KeyError: if the key is not in the queue
+        """
+        entry = self.entries[key]
+        if priority >= entry[0]:
+            return False
+        self.push(key, entry[3], priority)
+        return True
+
+    def remove(self, key: Hashable) -> None:
+        """
+        Removes the key from the queue.
+
+        :raises KeyError: if the key is not in the queue
+        """
+        entry = self.entries.pop(key)
+        entry[3] = REMOVED
+
+    def discard_removed(self) -> None:
+        """
+        Drops the marked entries from the top of the heap.
+        """
+        while self.heap and self.heap[0][3] is REMOVED:
+            heapq.heappop(self.heap)
+
+    def peek(self) -> Optional[tuple[tuple, Hashable, Any]]:
+        """
+        Returns (priority, key, item) of the entry with the lowest priority without removing it, or None if the queue is empty.
+        """
+        self.discard_removed()
+        if not self.heap:
+            return None
+        priority, _, key, item = self.heap[0]
+        return priority, key, item
+
+    def pop(self) -> tuple[tuple, Hashable, Any]:
+        """
+        Removes and returns (priority, key, item) of the entry with the lowest priority.
+
+        :raises IndexError: if the queue is empty
+        """
+        self.discard_removed()
+        if not self.heap:
+            raise IndexError("pop from an empty priority queue")
+        priority, _, key, item = heapq.heappop(self.heap)
+        del self.entries[key]
+        return priority, key, item
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,145 @@
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from wgups.Package import Package, PackageStatus
+
+
+def to_minutes(time: Optional[datetime]) -> int:
+    """
+    Returns the number of minutes since midnight of a time, or -1 if there is no time.
+    """
+    if time is None:
+        return -1
+    return time.hour * 60 + time.minute
+
+
+class PackageColumns:
+    """
+    This class is used to store the packages as a struct of arrays, one NumPy array per attribute,
+    so that routing can filter the packages with vectorized operations instead of touching Package objects.
+
+    Rows are kept dense: removing a package moves the last row into its place.
+
+    Attributes:
+        ids (np.ndarray): The id of each package
+        node (np.ndarray): The node of each package's address within the DistanceMap, -1 if unresolved
+        deadline_minutes (np.ndarray): The deadline of each package in minutes since midnight, -1 if due at the end of the day
+        available_minutes (np.ndarray): The time each package is available in minutes since midnight, -1 if not delayed
+        weight (np.ndarray): The weight of each package
+        status (np.ndarray): The PackageStatus value of each package
+        truck (np.ndarray): The truck each package is required to be on, 0 if any truck
+    """
+    COLUMNS = {
+        'ids': np.int64,
+        'node': np.int32,
+        'deadline_minutes': np.int32,
+        'available_minutes': np.int32,
+        'weight': np.float32,
+        'status': np.int8,
+        'truck': np.int8,
+    }
+
+    def __init__(self, capacity: int = 16):
+        """
+        Initializes the columns with room for capacity packages.
+        """
+        self.count = 0 # the number of packages in the columns
+        self.rows: dict[int, int] = {} # maps each package id to its row
+        for name, dtype in self.COLUMNS.items():
+            setattr(self, name, np.zeros(max(capacity, 1), dtype=dtype))
+
+    @classmethod
+    def from_packages(cls, packages: Iterable[Package]) -> 'PackageColumns':
+        """
+        Builds the columns from the packages.
+        """
+        packages = list(packages)
+        columns = cls(len(packages))
+        for package in packages:
+            columns.add(package)
+        return columns
+
+    def __len__(self):
+        return self.count
+
+    def grow(self) -> None:
+        """
+        Doubles the capacity of every column.
+        """
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(len(column) * 2, dtype=column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+
+    def add(self, package: Package) -> None:
+        """
+        Appends a row for the package, or refreshes its row if it is already stored.
+        """
+        if package.package_id in self.rows:
+            self.update(package)
+            return
+        if self.count == len(self.ids):
+            self.grow()
+        self.rows[package.package_id] = self.count
+        self.count += 1
+        self.update(package)
+
+    def update(self, package: Package) -> None:
+        """
+        Copies the attributes of the package into its row.
+        """
+        row = self.rows[package.package_id]
+        self.ids[row] = package.package_id
+        self.node[row] = package.node if package.node is not None else -1
+        self.deadline_minutes[row] = to_minutes(package.deadline)
+        self.available_minutes[row] = to_minutes(package.available_time)
+        self.weight[row] = package.weight if package.weight is not None else 0.0
+        self.status[row] = package.status.value
+        self.truck[row] = package.required_truck or 0
+
+    def remove(self, package_id: int) -> bool:
+        """
+        Removes the row of the package by moving the last row into its place.
+        """
+        row = self.rows.pop(package_id, None)
+        if row is None:
+            return False
+        last = self.count - 1
+        if row != last:
+            for name in self.COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+            self.rows[int(self.ids[row])] = row
+        self.count = last
+        return True
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns the live rows of a column.
+        """
+        return getattr(self, name)[:self.count]
+
+    def get_values(self, name: str, package_ids: Iterable[int]) -> np.ndarray:
+        """
+        Returns the values of a column for the packages, in the order given, in one vectorized gather.
+        """
+        rows = np.fromiter((self.rows[package_id] for package_id in package_ids), dtype=np.intp)
+        return getattr(self, name)[rows]
+
+    def eligible_ids(self, current_time: datetime, truck_id: int,
+                     statuses: tuple[PackageStatus, ...] = (PackageStatus.NOT_READY, PackageStatus.AT_HUB)) -> np.ndarray:
+        """
+        Returns the ids of the packages in one of the statuses that are available at the current time
+        and that are not required to be on another truck.
+        """
+        status = self.column('status')
+        available = self.column('available_minutes')
+        truck = self.column('truck')
+        mask = np.isin(status, [s.value for s in statuses])
+        mask &= (available < 0) | (available <= to_minutes(current_time))
+        mask &= (truck == 0) | (truck == truck_id)
+        return self.column('ids')[mask]
@@ -1,8 +1,12 @@
+import math
+from collections.abc import Iterable
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import Any, Optional
 
 from wgups.Package import Package, PackageStatus
+from wgups.datastore.PackageColumns import PackageColumns
+from wgups.datastore.PackageSnapshot import PackageSnapshot
 
 
 class SlotStatus(Enum):
@@ -14,21 +18,48 @@ class SlotStatus(Enum):
     DELETED = 2
 
 
+class ProbingStrategy(Enum):
+    """
+    This class is used to select how the package hash map probes for a slot.
+    """
+    QUADRATIC = 0 # quadratic probing with the c1 and c2 constants over a table of any size
+    TRIANGULAR = 1 # triangular probing over a power-of-two table, which visits every slot, with tombstone cleanup
+
+
 class PackageHashMap:
     """
     This class is used to store the packages in the hash map.
+
+    Next to the hash table it maintains secondary indexes over the attributes in INDEXED_ATTRIBUTES,
+    each mapping an attribute value to the packages that have it, so queries only touch the matching packages.
+    The indexes are updated on add and remove, and through Package.on_change when a package's status or address changes.
+
+    The live packages are also kept in a dense list, in insertion order until a removal moves the last package
+    into the freed position, so iterating over the hash map costs O(live packages) instead of O(table size).
+
+    With ProbingStrategy.TRIANGULAR the table size is kept to a power of two so that probing visits every slot,
+    insertions reuse deleted slots, and the table is rehashed in place once tombstones pile up.
     """
-    def __init__(self, size: int, c1:int = 1, c2:int = 1, load_factor:float = .75):
+    INDEXED_ATTRIBUTES = ('address', 'deadline', 'status', 'required_truck', 'available_time')
+    MAX_TOMBSTONE_RATIO = .25 # the share of deleted slots at which a triangular table is rehashed
+
+    def __init__(self, size: int, c1:int = 1, c2:int = 1, load_factor:float = .75, probing: ProbingStrategy = ProbingStrategy.QUADRATIC):
         """
         Initializes the PackageHashMap class.
         """
-        self.size = size # the size of the hash map
+        self.probing = probing # the probing strategy of the hash map
+        self.size = self.table_size(size) # the size of the hash map
         self.c1 = c1 # the first constant for quadratic probing
         self.c2 = c2 # the second constant for quadratic probing
         self.packages_table = [None] * self.size # the table of packages
         self.status_table = [SlotStatus.EMPTY] * self.size # the table of statuses
         self.load_factor = load_factor # the load factor of the hash map
         self.num_items = 0
+        self.num_deleted = 0 # the number of tombstones in the table
+        self.indexes: dict[str, dict[Any, dict[int, Package]]] = {attribute: {} for attribute in self.INDEXED_ATTRIBUTES} # attribute -> value -> {package id: package}
+        self.columns: Optional[PackageColumns] = None # optional struct-of-arrays copy of the packages, see enable_columns
+        self.dense: list[Package] = [] # the live packages, packed in insertion order
+        self.dense_positions: dict[int, int] = {} # maps each package id to its position in the dense list
 
     def hash_key(self, key:int) -> int:
         """
@@ -44,6 +75,22 @@ class PackageHashMap:
         quad_hashkey = (hash(key) + self.c1 * i + self.c2 * i * i) % self.size # hashes the package id and takes the modulus of the size of the hash map
         return quad_hashkey
 
+    def table_size(self, size: int) -> int:
+        """
+        Returns the table size to use for a requested size, rounded up to a power of two for triangular probing.
+        """
+        if self.probing is ProbingStrategy.TRIANGULAR:
+            return 1 << max(size - 1, 1).bit_length()
+        return size
+
+    def probe_bucket(self, key: int, i: int) -> int:
+        """
+        Returns the bucket of the i-th probe for a given package id using the probing strategy of the hash map.
+        """
+        if self.probing is ProbingStrategy.TRIANGULAR:
+            return (hash(key) + i * (i + 1) // 2) & (self.size - 1) # triangular numbers visit every slot of a power-of-two table
+        return self.quadratic_hash_key(key, i)
+
     def is_package(self, i:int) -> bool:
         """
         Returns True if the slot is occupied by a package, False otherwise.
@@ -55,28 +102,74 @@ class PackageHashMap:
         """
         Adds a package to the hash map.
         """
+        if not self.insert_into_table(package):
+            return False
+        self.append_dense(package) # adds the package to the dense list of live packages
+        self.index_package(package) # adds the package to the secondary indexes
+
+        # if the load factor is reached, resize the hash map
+        if float(self.num_items/self.size) >= self.load_factor:
+            self.resize() # resize the hash map
+        # if the live packages and tombstones together fill the table, rehash it at the same size to clear the tombstones
+        elif self.probing is ProbingStrategy.TRIANGULAR and float((self.num_items + self.num_deleted)/self.size) >= self.load_factor:
+            self.resize(self.size)
+        return True
+
+    def add_packages(self, packages: Iterable[Package], expected_count: Optional[int] = None) -> int:
+        """
+        Adds many packages to the hash map, sizing the table once up front instead of resizing as it fills.
+
+        :param packages: the packages to add
+        :param expected_count: the number of packages, if known; otherwise the packages are counted first
+        :return: the number of packages added
+        """
+        if expected_count is None:
+            packages = list(packages)
+            expected_count = len(packages)
+
+        # the smallest size that keeps the load factor below its limit once every package is added
+        required_size = math.floor((self.num_items + expected_count) / self.load_factor) + 1
+        if required_size > self.size:
+            self.resize(required_size)
+
+        added = 0
+        for package in packages:
+            if not self.insert_into_table(package):
+                continue
+            self.append_dense(package)
+            self.index_package(package)
+            added += 1
+            # only reached when expected_count was too low
+            if float(self.num_items/self.size) >= self.load_factor:
+                self.resize()
+        return added
+
+    def insert_into_table(self, package: Package) -> bool:
+        """
+        Places a package in the next empty bucket of the hash table, without resizing or indexing.
+        """
         i = 0 # the index of the slot
         buckets_probed = 0 # the number of buckets probed
 
+        reuse_deleted = self.probing is ProbingStrategy.TRIANGULAR # triangular probing fills tombstones instead of skipping them
+
         # hash function determines initial bucket
         bucket = self.hash_key(package.package_id) # hashes the package id and takes the modulus of the size of the hash map
         while buckets_probed < self.size: # while the number of buckets probed is less than the size of the hash map
 
             # insert item in next empty bucket
-            if self.status_table[bucket] is SlotStatus.EMPTY:
+            if self.status_table[bucket] is SlotStatus.EMPTY or (reuse_deleted and self.status_table[bucket] is SlotStatus.DELETED):
+                if self.status_table[bucket] is SlotStatus.DELETED:
+                    self.num_deleted -= 1
                 self.packages_table[bucket] = package
                 self.status_table[bucket] = SlotStatus.OCCUPIED
                 self.num_items += 1
-
-                # if the load factor is reached, resize the hash map
-                if float(self.num_items/self.size) >= self.load_factor:
-                    self.resize() # resize the hash map
                 return True
 
             # increment i and recompute bucket index
             # c1 and c2 are programmer-defined constants for quadratic probing
             i += 1 # increment the index of the slot
-            bucket = self.quadratic_hash_key(package.package_id, i) # hashes the package id and takes the modulus of the size of the hash map
+            bucket = self.probe_bucket(package.package_id, i) # hashes the package id and takes the modulus of the size of the hash map
 
             # increment number of buckets probed
             buckets_probed += 1
@@ -102,7 +195,7 @@ class PackageHashMap:
 
             # increment i and recompute bucket instance
             i += 1
-            bucket = self.quadratic_hash_key(key, i)
+            bucket = self.probe_bucket(key, i)
 
             # increment number of buckets probed
             buckets_probed += 1
@@ -124,14 +217,21 @@ class PackageHashMap:
 
             # if the slot is occupied by a package and the package id is the same as the key, remove the package
             if self.status_table[bucket] is SlotStatus.OCCUPIED and self.packages_table[bucket].package_id == key:
+                self.unindex_package(self.packages_table[bucket]) # removes the package from the secondary indexes
+                self.remove_dense(key) # removes the package from the dense list of live packages
                 self.packages_table[bucket] = None
                 self.status_table[bucket] = SlotStatus.DELETED
                 self.num_items -= 1
+                self.num_deleted += 1
+
+                # rehash a triangular table in place once too many slots are tombstones
+                if self.probing is ProbingStrategy.TRIANGULAR and float(self.num_deleted/self.size) >= self.MAX_TOMBSTONE_RATIO:
+                    self.resize(self.size)
                 return True
 
             # increment i and recompute bucket index
             i += 1
-            bucket = self.quadratic_hash_key(key, i)
+            bucket = self.probe_bucket(key, i)
 
             # increment number of buckets probed
             buckets_probed += 1
@@ -139,36 +239,205 @@ class PackageHashMap:
         return False
 
 
-    def resize(self):
+    def resize(self, new_size: Optional[int] = None):
         """
-        Resizes the hash map.
+        Resizes the hash map, doubling its size unless a new size is given.
         """
         # save the old packages table, status table, and size
         old_packages_table = self.packages_table
         old_status_table = self.status_table
         old_size = self.size # save the old size
 
-        # double the size of the hash map
-        self.size = old_size * 2
+        # double the size of the hash map, or use the requested size
+        self.size = self.table_size(new_size if new_size is not None else old_size * 2)
         # create a new packages table with the new size
         self.packages_table = [None] * self.size
         # create a new status table with the new size
         self.status_table = [SlotStatus.EMPTY] * self.size
-        # reset the number of items
+        # reset the number of items, the new table has no tombstones
         self.num_items = 0
+        self.num_deleted = 0
 
         # for each slot in the old hash map
         for i in range(old_size):
             # if the slot is occupied, add the package to the new hash map
             if old_status_table[i] == SlotStatus.OCCUPIED:
-                self.add_package(old_packages_table[i]) # add the package to the new hash map
+                self.insert_into_table(old_packages_table[i]) # add the package to the new hash map, its index entries are unchanged
+
+    def append_dense(self, package: Package) -> None:
+        """
+        Appends a package to the dense list of live packages.
+        """
+        self.dense_positions[package.package_id] = len(self.dense)
+        self.dense.append(package)
+
+    def remove_dense(self, package_id: int) -> None:
+        """
+        Removes a package from the dense list of live packages in O(1) by moving the last package into its position.
+        """
+        position = self.dense_positions.pop(package_id, None)
+        if position is None:
+            return
+        last = self.dense.pop()
+        if position < len(self.dense):
+            self.dense[position] = last
+            self.dense_positions[last.package_id] = position
+
+    def values(self) -> list[Package]:
+        """
+        Returns a list of the live packages without scanning the hash table.
+        """
+        return list(self.dense)
+
+    def ids(self):
+        """
+        Returns a live view of the ids of the packages in the hash map.
+        """
+        return self.dense_positions.keys()
+
+    def snapshot(self) -> PackageSnapshot:
+        """
+        Returns a copy-on-write view of the hash map, in which changes to the packages are recorded as overlays
+        and never reach the packages of the hash map.
+        """
+        return PackageSnapshot(self)
+
+    def get_probe_stats(self) -> dict[str, float]:
+        """
+        Returns statistics on the cost of looking up the packages currently in the hash map:
+        the mean and max number of probes a successful search takes, the load, and the share of slots that are tombstones.
+        """
+        probe_counts = []
+        for slot in range(self.size):
+            if self.status_table[slot] is not SlotStatus.OCCUPIED:
+                continue
+            key = self.packages_table[slot].package_id
+            # replay the probe sequence of the key until it reaches the slot the package is in
+            i = 0
+            bucket = self.hash_key(key)
+            while bucket != slot:
+                i += 1
+                bucket = self.probe_bucket(key, i)
+            probe_counts.append(i + 1)
+
+        return {
+            'mean_probes': sum(probe_counts) / len(probe_counts) if probe_counts else 0.0,
+            'max_probes': max(probe_counts, default=0),
+            'load': self.num_items / self.size,
+            'tombstone_ratio': self.num_deleted / self.size,
+        }
+
+    def enable_columns(self) -> PackageColumns:
+        """
+        Builds a columnar copy of the packages that is kept in sync with the hash map from then on.
+        """
+        if self.columns is None:
+            self.columns = PackageColumns.from_packages(self)
+        return self.columns
+
+    def index_package(self, package: Package) -> None:
+        """
+        Adds a package to every secondary index and subscribes to its changes.
+        """
+        for attribute, index in self.indexes.items():
+            index.setdefault(getattr(package, attribute), {})[package.package_id] = package
+        if self.columns is not None:
+            self.columns.add(package)
+        package.on_change = self.update_index
+
+    def unindex_package(self, package: Package) -> None:
+        """
+        Removes a package from every secondary index and unsubscribes from its changes.
+        """
+        for attribute, index in self.indexes.items():
+            self.remove_from_index(index, getattr(package, attribute), package.package_id)
+        if self.columns is not None:
+            self.columns.remove(package.package_id)
+        package.on_change = None
+
+    @staticmethod
+    def remove_from_index(index: dict[Any, dict[int, Package]], value: Any, package_id: int) -> None:
+        """
+        Removes a package id from the bucket of an index, dropping the bucket once it is empty.
+        """
+        bucket = index.get(value)
+        if bucket is not None:
+            bucket.pop(package_id, None)
+            if not bucket:
+                del index[value]
+
+    def update_index(self, package: Package, attribute: str, old_value: Any) -> None:
+        """
+        Moves a package to its new bucket after one of its indexed attributes has changed.
+        This is registered as the package's on_change listener.
+        """
+        if self.columns is not None:
+            self.columns.update(package)
+        index = self.indexes.get(attribute)
+        if index is None:
+            return
+        self.remove_from_index(index, old_value, package.package_id)
+        index.setdefault(getattr(package, attribute), {})[package.package_id] = package
+
+    def query_index(self, attribute: str, value: Any) -> list[Package]:
+        """
+        Returns the packages whose indexed attribute is equal to the value, in the order they were added.
+        """
+        return list(self.indexes[attribute].get(value, {}).values())
+
+    def get_packages_by_address(self, address: str) -> list[Package]:
+        """
+        Returns the packages delivered to the address.
+        """
+        return self.query_index('address', address)
+
+    def get_packages_by_deadline(self, deadline: Optional[datetime]) -> list[Package]:
+        """
+        Returns the packages with the deadline, None returns the packages due at the end of the day.
+        """
+        return self.query_index('deadline', deadline)
+
+    def get_packages_with_deadline(self) -> list[Package]:
+        """
+        Returns every package that has a deadline, ordered from the earliest deadline.
+        """
+        index = self.indexes['deadline']
+        return [package for deadline in sorted(key for key in index if key is not None)
+                for package in index[deadline].values()]
+
+    def get_packages_by_status(self, *statuses: PackageStatus) -> list[Package]:
+        """
+        Returns the packages that are in any of the statuses.
+        """
+        return [package for status in statuses for package in self.query_index('status', status)]
+
+    def get_packages_by_truck(self, required_truck: Optional[int]) -> list[Package]:
+        """
+        Returns the packages that can only be delivered by the truck, None returns the packages with no required truck.
+        """
+        return self.query_index('required_truck', required_truck)
+
+    def get_packages_by_available_time(self, available_time: Optional[datetime]) -> list[Package]:
+        """
+        Returns the packages that become available at the time, None returns the packages with no delay.
+        """
+        return self.query_index('available_time', available_time)
+
+    def get_packages_available_by(self, current_time: datetime) -> list[Package]:
+        """
+        Returns the packages that have no delay or that are available at the current time.
+        """
+        index = self.indexes['available_time']
+        return [package for available_time, bucket in index.items()
+                if available_time is None or available_time <= current_time
+                for package in bucket.values()]
 
     def __str__(self):
         """
         Returns a string representation of the hash map.
         """
         count = self.num_items # get the number of items
-        preview_packages = list(self.packages_table)[:3] # get the first three packages
+        preview_packages = self.dense[:3] # get the first three packages
         return (f"PackageHashMap with {count} packages "
                 f"(sample packages: {', '.join(map(str, preview_packages))})")
 
@@ -176,11 +445,13 @@ class PackageHashMap:
         """
         Returns an iterator over the hash map.
         """
-        # for each package and status in the hash map
-        for package, status in zip(self.packages_table, self.status_table):
-            # if the slot is occupied and the package is a package, yield the package
-            if status == SlotStatus.OCCUPIED and isinstance(package, Package):
-                yield package
+        return iter(self.dense) # only the live packages are visited, empty and deleted slots are never touched
+
+    def __len__(self):
+        """
+        Returns the number of packages in the hash map.
+        """
+        return self.num_items
 
     def __getitem__(self, key: int) -> Package:
         """
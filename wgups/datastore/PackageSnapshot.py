@@ -0,0 +1,166 @@
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from wgups.Package import Package, PackageStatus
+
+if TYPE_CHECKING:
+    from wgups.datastore.PackageHashMap import PackageHashMap
+
+
+class PackageOverlay(Package):
+    """
+    A copy-on-write view of a package inside a PackageSnapshot.
+
+    The overlay starts with none of the Package attributes set, so every read falls through to the base package.
+    Writes, including those made by the Package setters, fill the overlay's own slot and leave the base package untouched.
+    Attributes holding lists or sets are shared with the base package until they are reassigned, so they must not be
+    modified in place.
+    """
+    __slots__ = ('base',)
+
+    def __init__(self, base: Package, on_change=None):
+        """
+        Initializes the overlay over a base package.
+
+        :param base: the package the unchanged attributes are read from
+        :param on_change: the listener notified when an attribute changes through a setter
+        """
+        self.base = base
+        self.on_change = on_change # shadows the base package's listener so changes never reach the base hash map
+
+    def __getattr__(self, name: str) -> Any:
+        """
+        Returns the attribute of the base package, only called for the attributes the overlay has not written.
+        """
+        if name == 'base':
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    def changed_attributes(self) -> dict[str, Any]:
+        """
+        Returns the attributes written to the overlay and their values.
+        """
+        changes = {}
+        for name in Package.__slots__:
+            if name == 'on_change':
+                continue
+            try:
+                changes[name] = Package.__dict__[name].__get__(self) # reads the overlay's own slot, without falling through
+            except AttributeError:
+                continue
+        return changes
+
+
+class PackageSnapshot:
+    """
+    A copy-on-write view of a PackageHashMap, or of another snapshot, for simulating alternative plans.
+
+    Looking a package up returns a PackageOverlay, created once per package and reused, that records the mutations
+    made by Routing and Truck without changing the shared base packages. Many snapshots can be taken of the same base
+    and simulated side by side. The snapshot supports the lookups Routing relies on.
+    """
+    def __init__(self, base: Union['PackageHashMap', 'PackageSnapshot']):
+        """
+        Initializes the snapshot over a base hash map or snapshot.
+        """
+        self.base = base
+        self.overlays: dict[int, PackageOverlay] = {} # the overlays created so far, keyed by package id
+        self.changed: dict[str, set[int]] = {} # attribute -> ids of the packages whose attribute changed in this snapshot
+        self.columns = None # the snapshot has no columnar copy, so Routing reads the nodes from the packages
+
+    def overlay(self, package: Package) -> PackageOverlay:
+        """
+        Returns the overlay of a base package, creating it on first access.
+        """
+        overlay = self.overlays.get(package.package_id)
+        if overlay is None:
+            overlay = PackageOverlay(package, self.record_change)
+            self.overlays[package.package_id] = overlay
+        return overlay
+
+    def record_change(self, package: Package, attribute: str, old_value: Any) -> None:
+        """
+        Records that an attribute of a package changed in this snapshot.
+        This is registered as the on_change listener of every overlay.
+        """
+        self.changed.setdefault(attribute, set()).add(package.package_id)
+
+    def search_package(self, key: int) -> Optional[Package]:
+        """
+        Searches for a package in the snapshot.
+        """
+        package = self.base.search_package(key)
+        if package is None:
+            return None
+        return self.overlay(package)
+
+    def __getitem__(self, key: int) -> Package:
+        """
+        Returns the package with the given key.
+        """
+        result = self.search_package(key)
+        if result is None:
+            raise KeyError(key)
+        return result
+
+    def __iter__(self) -> Iterator[Package]:
+        """
+        Returns an iterator over the packages of the snapshot.
+        """
+        for package in self.base:
+            yield self.overlay(package)
+
+    def __len__(self):
+        return len(self.base)
+
+    def values(self) -> list[Package]:
+        """
+        Returns a list of the packages of the snapshot.
+        """
+        return list(self)
+
+    def ids(self):
+        """
+        Returns the ids of the packages of the snapshot.
+        """
+        return self.base.ids()
+
+    def query_index(self, attribute: str, value: Any) -> list[Package]:
+        """
+        Returns the packages whose attribute is equal to the value in this snapshot.
+        The base index answers for the unchanged packages, and the packages changed in this snapshot are checked directly.
+        """
+        changed_ids = self.changed.get(attribute, set())
+        matches = [self.overlay(package) for package in self.base.query_index(attribute, value)
+                   if package.package_id not in changed_ids]
+        matches.extend(self.overlays[pid] for pid in changed_ids if getattr(self.overlays[pid], attribute) == value)
+        return matches
+
+    def get_packages_by_address(self, address: str) -> list[Package]:
+        """
+        Returns the packages delivered to the address.
+        """
+        return self.query_index('address', address)
+
+    def get_packages_by_status(self, *statuses: PackageStatus) -> list[Package]:
+        """
+        Returns the packages that are in any of the statuses.
+        """
+        return [package for status in statuses for package in self.query_index('status', status)]
+
+    def snapshot(self) -> 'PackageSnapshot':
+        """
+        Returns a snapshot layered on top of this one.
+        """
+        return PackageSnapshot(self)
+
+    def get_changes(self) -> dict[int, dict[str, Any]]:
+        """
+        Returns the attributes changed in this snapshot, keyed by package id.
+        """
+        changes = {}
+        for package_id, overlay in self.overlays.items():
+            changed = overlay.changed_attributes()
+            if changed:
+                changes[package_id] = changed
+        return changes
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+import numpy as np
+
+
+class TravelTimeMatrix:
+    """
+    This class is used to store the travel times between every pair of addresses at one speed, derived once from
+    the distances, so that routing adds them to datetimes without building a new timedelta on every lookup.
+
+    The travel times are symmetric like the distances, so only their lower triangle is kept, in the same layout as
+    the packed distances: one list per row, row i holding the travel times from address i to addresses 0 to i.
+    Appending addresses appends rows and leaves the rows already built untouched.
+    """
+    def __init__(self, speed: float):
+        """
+        Initializes the TravelTimeMatrix class.
+
+        :param speed: the average speed in miles per hour
+        """
+        self.speed = speed
+        self.seconds_per_mile = 3600.0 / speed
+        self.rows: list[list[timedelta]] = [] # row i holds the travel times from address i to addresses 0 to i
+
+    def extend(self, cells: np.ndarray) -> None:
+        """
+        Appends the rows held by the cells, converting their distances in one pass.
+
+        :param cells: the distances of the next rows of the lower triangle, packed row by row,
+            starting with the row after the last one built
+        """
+        seconds = (np.asarray(cells, dtype=np.float64) * self.seconds_per_mile).tolist()
+        offset = 0
+        while offset < len(seconds):
+            length = len(self.rows) + 1 # row i holds i + 1 cells
+            self.rows.append([timedelta(seconds=value) for value in seconds[offset:offset + length]])
+            offset += length
+
+    def rebuild(self, triangle: np.ndarray) -> None:
+        """
+        Rebuilds every row from a new triangle, in place, so the matrices already handed out stay valid.
+        """
+        self.rows.clear()
+        self.extend(triangle)
+
+    def get(self, i: int, j: int) -> timedelta:
+        """
+        Returns the travel time between two addresses using their indices within the matrix.
+        """
+        if i < j:
+            i, j = j, i # the cell above the diagonal is read from its mirror in the lower triangle
+        return self.rows[i][j]
+
+    def __len__(self):
+        return len(self.rows)